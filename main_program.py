@@ -1,16 +1,18 @@
-import math
+import asyncio
+import logging
 import wx
-import skimage.measure
 import os
 import openpyxl
-import pandas as pd
 import numpy as np
 import stegano_functions as stegano 
-import sewar_full_ref as sewar
 import stegano_statistics as statistics
+import stegano_histogram as histogram
+import stegano_steganalysis as steganalysis
+import stegano_verdict
+import stegano_io
+import stegano_ingest
+import stegano_profiling as profiling
 from PIL import Image
-from brisque import BRISQUE
-from numpy import asarray
 
 
 """ ACTIVATE_BUTTON can be either set to True or False.
@@ -22,6 +24,16 @@ from numpy import asarray
 
 ACTIVATE_BUTTON = False
 
+# Only used if ACTIVATE_BUTTON = True. If True, IMAGES_FOLDER is watched and 
+# every image arriving there is encoded (stop with Ctrl+C); the Excel file 
+# is written when the watch ends.
+WATCH_FOLDER = False
+
+# Seconds between two scans of IMAGES_FOLDER and number of images encoded at 
+# the same time in WATCH_FOLDER mode.
+WATCH_POLL_INTERVAL = 2.0
+WATCH_WORKERS = 4
+
 ### Change the following parameters if ACTIVATE_BUTTON = True
 
 # Folder path containing images for encoding.
@@ -30,15 +42,56 @@ IMAGES_FOLDER = "C:\\[example]\ImagesToEncode"
 # Folder path where encoded images are saved
 OUTPUT_DIRECTORY = r'C:\\[example]\encoded_images'
 
+# Which encoded images are saved: "all", "none" or "selected" (only the 
+# (colour channels, bit depth) pairs listed in SAVE_COMBINATIONS).
+SAVE_POLICY = "all"
+SAVE_COMBINATIONS = [("RGB", 1), ("RGB", 4)]
+
+# What is saved: "image" (the full encoded image), "bitplanes" (only the low 
+# bits of the encoded channels) or "diff" (XOR against the original image).
+SAVE_CONTENT = "image"
+
+# zlib compression level of saved PNG files (0 = fastest, 9 = smallest).
+PNG_COMPRESS_LEVEL = 1
+
+# Number of images decoded ahead of the one being encoded, and number of 
+# save/result jobs that may wait for the background writer.
+PREFETCH_DEPTH = 4
+WRITE_QUEUE_DEPTH = 16
+
 # File path of Excel file where data will be transferred
 EXCEL_FILE = "C:\\Users\[example]\image_quality_results.xlsx"   
 
+# File path of CSV file where results are appended while the sweep runs.
+# Restarting the sweep skips every job already present in this file.
+RESULTS_FILE = "C:\\Users\[example]\image_quality_results.csv"
+
 # List of colour channels to be encoded
 COLOUR_CHANNELS_LIST = ["RGB","R", "G", "B", "RG", "RB", "GB"]
 
 # List of bit depths which will be analyzed
 BIT_DEPTH_LIST = [1, 2, 3, 4, 5, 6, 7] 
 
+# Side length of the blocks analysed by the steganalysis detectors (the 
+# ChiSquareP, RSRate and SPARate columns).
+STEGANALYSIS_BLOCK_SIZE = 64
+
+# Record per-stage timings and counters of the sweep in METRICS_FILE.
+PROFILE_SWEEP = False
+METRICS_FILE = "C:\\Users\[example]\sweep_metrics.jsonl"
+
+# File for a cProfile dump of the sweep (None = off) and whether to log the 
+# largest memory allocations (tracemalloc) of the sweep.
+PROFILE_CPU_FILE = None
+PROFILE_MEMORY = False
+
+# If True, the GUI computes every image quality measure; if False, the 
+# measures left once the verdict is settled are skipped (shown as "-").
+GUI_FULL_METRICS = False
+
+# Level of console messages (logging.DEBUG also shows per-call details).
+LOG_LEVEL = logging.INFO
+
 HELP_MESSAGE = """
 Here are the following steps required to use this steganography tool.
                        
@@ -53,6 +106,11 @@ Here are the following steps required to use this steganography tool.
     selecting a file location
     """     
 
+# Background colours of the measure ratings and of the verdicts.
+RATING_COLOURS = {"red": (255, 0, 0, 255), "yellow": (255, 255, 0, 255), 
+                  "green": (0, 255, 0, 255)}
+VERDICT_COLOURS = {"Good!": "dark green", "?": "orange", "Bad!": "red"}
+
 class GuiCompareDialog(wx.Dialog):
     """Create GUI with wx.Dialog. Includes image comparison, button binding, 
         event handling and calculation of image quality measures.
@@ -266,6 +324,14 @@ class GuiCompareDialog(wx.Dialog):
         # The default is off and enables once the encoded image is loaded.
         self.save_button.Enable(False)      
         self.save_button.Bind(wx.EVT_BUTTON, self.save_encoded_image_bitmap)
+
+        # Auto-tune Button, enabled together with the save button.
+        self.tune_button = wx.Button(self, wx.ID_ANY, "Auto-tune")
+        self.tune_button.SetMinSize((100, 35))
+        sizer_lowerpart_buttons.Add(self.tune_button, 0, 
+                                    wx.ALIGN_CENTER_VERTICAL | wx.ALL, 15)
+        self.tune_button.Enable(False)
+        self.tune_button.Bind(wx.EVT_BUTTON, self.on_tune_click)
     
         # Bits Slider
         bits_to_encode_statictext = wx.StaticText(self, wx.ID_ANY,
@@ -330,6 +396,10 @@ class GuiCompareDialog(wx.Dialog):
         sizer_lowerpart_buttons.Add(self.blue_colour_channel, 0, 
                                     wx.ALIGN_CENTER_VERTICAL, 0)
 
+        # Status line with the duration of each processing stage.
+        self.status_statictext = wx.StaticText(self, wx.ID_ANY, "")
+        sizer_main.Add(self.status_statictext, 0, wx.LEFT | wx.BOTTOM, 15)
+
         self.SetSizer(sizer_main)
         
         # Close the interface upon the user exiting.
@@ -338,11 +408,8 @@ class GuiCompareDialog(wx.Dialog):
         self.Layout()
         
         # End of wxGlade.
-        self.psnr_perceptible = 0
-        self.mse_perceptible = 0
-        self.ssim_perceptible = 0
-        self.entropy_perceptible = 0
-        self.brisque_perceptible = 0
+        # Measures of the original image, shared by all its encodings.
+        self.original_scores = {}
 
     def get_colour_space(self):
         """ Check which colour channel checkboxes are ticked in GUI
@@ -369,63 +436,16 @@ class GuiCompareDialog(wx.Dialog):
             
         return colour_space
     
-    def get_statistics_mse(self):
-        """Calculate the Mean Squared Error (mse)
-        
-            return mse rounded to 3 decimal places
-        """
-        height = self.original_image.height
-        width = self.original_image.width
-        mse_sum = 0.0
-        
-        for i in range(height):
-            for j in range(width): 
-                # Extract the RGB values from each pixel in the original image
-                #
-                # and encoded image.
-                r1, g1, b1 = self.original_image.getpixel((j, i)) 
-                r2, g2, b2 = self.encoded_image.getpixel((j, i))
-                
-                mse_sum += ((r1 - r2) ** 2) + ((g1 - g2) ** 2) 
-                + ((b1 - b2) ** 2)
-                
-        mse = mse_sum / (400 * 400 * 3)
-        
-        return str(round(mse, 3))
-    
-    def get_statistics_psnr(self, mse):
-        """Calculate the Peak signal-to-noise ratio (psnr)
-        
-            return psnr rounded to 3 decimal places
+    def show_measure(self, statictext, measure, ratings, label):
+        """ Show the value of an image quality measure with the background 
+            colour of its rating, or "-" if the measure was skipped.
         """
-        psnr = 20 * math.log(255/(math.sqrt(float(mse))), 10)
-        return str(round(psnr, 3))
-    
-    def get_statistics_ssim(self):
-        """Calculate the Structural similarity index measure (ssim)
-        
-            return ssim rounded to 3 decimal places
-        """
-        ssim, css = sewar.ssim(self.original_image_temp, self.encoded_image_temp) 
-        return str(round(ssim, 3))
-
-    def get_statistics_entropy(self, image):
-        """Calculate the entropy
-        
-            return entropy rounded to 3 decimal places
-        """
-        entropy = skimage.measure.shannon_entropy(image)
-        return float(round(entropy, 3))
-
-    def get_statistics_brisque(self, image):
-        """Calculate the BRISQUE Score
-        
-            return BRISQUE Score rounded to 3 decimal places
-        """
-        numpydata = asarray(image)
-        object = BRISQUE(url=False)
-        result = object.score(numpydata)
-        return float(round(result, 3))
+        if measure in ratings:
+            statictext.SetBackgroundColour(RATING_COLOURS[ratings[measure]])
+            statictext.SetLabel(label)
+        else:
+            statictext.SetBackgroundColour(wx.NullColour)
+            statictext.SetLabel("-")
            
     def on_open_file(self, event):
         """ Retrieve image file path from importing button and show image 
@@ -446,12 +466,11 @@ class GuiCompareDialog(wx.Dialog):
             
             # Convert the image from RGBA format to RGB format.
             self.original_image = Image.open(self.image_path).convert("RGB")  
-            
-            # Convert to numPy format to be compatible with ssim formula.
-            self.original_image_temp = np.array(self.original_image)  
+            self.original_scores = {}
  
             # Upon opening an image, the save button becomes usable.
             self.save_button.Enable(True)
+            self.tune_button.Enable(True)
             
             self.show_images()
 
@@ -470,6 +489,26 @@ class GuiCompareDialog(wx.Dialog):
         """
         self.show_images()
 
+    def on_tune_click(self, event):
+        """ Choose the bits and colour channels with the highest capacity 
+            whose encoding is still rated "Good!" and show the result.
+        """
+        setting = stegano_verdict.tune(self.original_image, contents, 
+                                       reference=self.original_scores)
+        if setting is None:
+            dlg = wx.MessageDialog(self, "No setting is rated Good!", 
+                                   "Auto-tune")
+            dlg.ShowModal()
+            dlg.Destroy()
+            return
+
+        n_bits, colour_space = setting
+        self.number_bits_slider.SetValue(n_bits)
+        self.red_colour_channel.SetValue("R" in colour_space)
+        self.green_colour_channel.SetValue("G" in colour_space)
+        self.blue_colour_channel.SetValue("B" in colour_space)
+        self.show_images()
+
     def on_close(self, event):
         """Destroy dialog after closing.
         """
@@ -524,156 +563,52 @@ class GuiCompareDialog(wx.Dialog):
            channel checkbox. Display new encoded image and update statistics.
         """
         colour_space = self.get_colour_space()
+        
+        # Time each stage for the status line.
+        profiling.enable()
+        profiling.reset()
 
         # Encode image with user-chosen parameters.
-        self.encoded_image = stegano.encode(
-          self.original_image, contents, 
-          self.number_bits_slider.Value, colour_space) 
-        
-        # Convert to numPy format to be compatible with ssim formula.
-        self.encoded_image_temp = np.array(self.encoded_image)
+        with profiling.stage("encode"):
+            self.encoded_image = stegano.encode(
+              self.original_image, contents, 
+              self.number_bits_slider.Value, colour_space) 
         
         height = self.encoded_image.height
         width = self.encoded_image.width
         
-        ### Retrieve the results from Image Quality Measures.
-        # MSE
-        self.mse_result = self.get_statistics_mse()
-        
-        # This is the range concluded from results of experiment.
-        if float(self.mse_result) >= 206.13825:
-            # Set background colour to red.
-            self.mse_result_statictext.SetBackgroundColour((255, 0, 
-                                                            0, 255)) 
-        elif float(self.mse_result) < 206.13825 and (float(self.mse_result) 
-                                                     >= 7.1765):
-            self.mse_perceptible = 1
-            # Set background colour to yellow.
-            self.mse_result_statictext.SetBackgroundColour((255, 255, 
-                                                             0, 255))
-        else:
-            # Set background colour to green.
-            self.mse_result_statictext.SetBackgroundColour((0, 255, 
-                                                            0, 255)) 
-        self.mse_result_statictext.SetLabel(self.mse_result)
- 
-        # PSNR
-        psnr_result = self.get_statistics_psnr(self.mse_result)
-        
-        # This is the range concluded from results of experiment.
-        if float(psnr_result) <= 25.0985:
-            self.psnr_perceptible = 1
-            # Set background colour to red.
-            self.psnr_result_statictext.SetBackgroundColour((255, 0, 
-                                                             0, 255))
-        elif float(psnr_result) <= 39.6945 and float(psnr_result) > 25.0985:
-            self.psnr_perceptible = 1
-            # Set background colour to yellow.
-            self.psnr_result_statictext.SetBackgroundColour((255, 255, 
-                                                             0, 255))
-        else:
-            self.psnr_perceptible = 0
-            # Set background colour to green.
-            self.psnr_result_statictext.SetBackgroundColour((0, 255, 
-                                                             0, 255))
-        self.psnr_result_statictext.SetLabel(psnr_result)
-        
-        # SSIM
-        ssim_result = self.get_statistics_ssim()
-        
-        # This is the range concluded from results of experiment.
-        if float(ssim_result) <= 0.80291:
-            self.ssim_perceptible = 1
-            # Set background colour to red.
-            self.ssim_result_statictext.SetBackgroundColour((255, 0, 
-                                                             0, 255))
-        elif float(ssim_result) <= 0.9865 and float(ssim_result) > 0.80291:
-            self.ssim_perceptible = 1
-            # Set background colour to yellow.
-            self.ssim_result_statictext.SetBackgroundColour((255, 255, 
-                                                             0, 255))
-        else:
-            self.ssim_perceptible = 0
-            # Set background colour to green.
-            self.ssim_result_statictext.SetBackgroundColour((0, 255, 
-                                                             0, 255))
-        self.ssim_result_statictext.SetLabel(ssim_result)
-        
-        # Entropy
-        entropy_result_original_image = self.get_statistics_entropy(
-          self.original_image)
-        entropy_result_encoded_image = self.get_statistics_entropy(
-          self.encoded_image)
-        delta_entropy_result = math.sqrt((entropy_result_original_image 
-                                    - entropy_result_encoded_image)**2)
-        
-        # This is the range concluded from results of experiment.
-        if float(delta_entropy_result) > 0.02975:
-            self.entropy_perceptible = 1
-            # Set background colour to red.
-            self.entropy_result_statictext.SetBackgroundColour((255, 0, 
-                                                             0, 255))
-        else:
-            self.entropy_perceptible = 0
-            # Set background colour to green.
-            self.entropy_result_statictext.SetBackgroundColour((0, 255, 
-                                                                0, 255))
-        
-        concatenate_temp = (str(entropy_result_original_image) 
-                            + "       " + str(entropy_result_encoded_image))
-        self.entropy_result_statictext.SetLabel(concatenate_temp)
-        
-        # BRISQUE
-        brisque_result_original_image = self.get_statistics_brisque(
-          self.original_image)
-        brisque_result_encoded_image = self.get_statistics_brisque(
-          self.encoded_image)
-        delta_brisque_result = math.sqrt((brisque_result_original_image 
-                                   - brisque_result_encoded_image)**2)
-        
-        # This is the range concluded from results of experiment.
-        if float(delta_brisque_result) >= 22.79:
-            self.brisque_perceptible = 1
-            # Set background colour to red.
-            self.brisque_result_statictext.SetBackgroundColour((255, 0, 
-                                                                0, 255))
-        elif (float(delta_brisque_result) >= 6.309 
-              and float(delta_brisque_result) < 22.79):
-            self.brisque_perceptible = 1
-            # Set background colour to yellow.
-            self.brisque_result_statictext.SetBackgroundColour((255, 255, 
-                                                                0, 255))
-        else:
-            self.brisque_perceptible = 0
-            # Set background colour to green.
-            self.brisque_result_statictext.SetBackgroundColour((0, 255, 
-                                                                0, 255))
-            
-        concatenate_temp = (str(brisque_result_original_image) + "       " 
-                            + str(brisque_result_encoded_image))
-        self.brisque_result_statictext.SetLabel(concatenate_temp)
-    
-        # Decide combined value from all 5 measures if overall results is 
+        ### Rate the Image Quality Measures (ranges concluded from results of
         #
-        # perceptible.
-        sum_measures_perceptible = (self.psnr_perceptible 
-          + self.mse_perceptible + self.ssim_perceptible 
-          + self.entropy_perceptible + self.brisque_perceptible)
-        
-        if sum_measures_perceptible < 3:
-            self.statistics_statictext.SetBackgroundColour("dark green")
-            self.statistics_statictext.SetLabel("Statistics (Good!)")
-        elif sum_measures_perceptible == 3:
-            self.statistics_statictext.SetBackgroundColour("orange")
-            self.statistics_statictext.SetLabel("Statistics (?)")
-        else: 
-            self.statistics_statictext.SetBackgroundColour("red")
-            self.statistics_statictext.SetLabel("Statistics (Bad!)")
+        # experiment, see stegano_verdict.THRESHOLDS).
+        verdict, scores, ratings = stegano_verdict.evaluate(
+          self.original_image, self.encoded_image, colour_space, 
+          GUI_FULL_METRICS, self.original_scores)
+        
+        self.show_measure(self.mse_result_statictext, "MSE", ratings, 
+                          str(scores.get("MSE")))
+        self.show_measure(self.psnr_result_statictext, "PSNR", ratings, 
+                          str(scores.get("PSNR")))
+        self.show_measure(self.ssim_result_statictext, "SSIM", ratings, 
+                          str(scores.get("SSIM")))
+        self.show_measure(
+          self.entropy_result_statictext, "Entropy", ratings, 
+          str(scores.get("EntropyOriginal")) + "       " 
+          + str(scores.get("EntropyEncoded")))
+        self.show_measure(
+          self.brisque_result_statictext, "BRISQUE", ratings, 
+          str(scores.get("BrisqueOriginal")) + "       " 
+          + str(scores.get("BrisqueEncoded")))
+    
+        # Combined verdict of the measures.
+        self.statistics_statictext.SetBackgroundColour(
+          VERDICT_COLOURS[verdict])
+        self.statistics_statictext.SetLabel("Statistics (" + verdict + ")")
         
         image = wx.Image(width, height)
         image.SetData(self.encoded_image.tobytes())
         wx_bitmap = image.ConvertToBitmap()   
         self.encoded_image_bitmap.SetBitmap(wx_bitmap)
+        self.status_statictext.SetLabel(profiling.format_last_timings())
         self.Layout()
 
 class GuiCompareApp(wx.App):
@@ -697,95 +632,208 @@ class GuiCompareApp(wx.App):
 def excel_data_transfer():
     """Transfer results to Excel File.
     """
+    profiling.enable(PROFILE_SWEEP)
+    with profiling.profile(PROFILE_CPU_FILE, PROFILE_MEMORY):
+        _run_sweep()
+    
+    if PROFILE_SWEEP:
+        profiling.write_metrics(METRICS_FILE, images_folder=IMAGES_FOLDER)
+        
+    # Save the results to an Excel file.
+    stegano_io.export_results(RESULTS_FILE, EXCEL_FILE)
+
+
+def watch_folder_transfer():
+    """Encode images as they arrive in IMAGES_FOLDER and transfer the results
+       to Excel File when the watch is stopped.
+    """
+    if SAVE_POLICY != "none":
+        os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+    completed_jobs = stegano_io.load_completed_jobs(RESULTS_FILE)
+    
+    try:
+        asyncio.run(stegano_ingest.watch_folder(
+          IMAGES_FOLDER, 
+          lambda file: process_image_file(file, completed_jobs), 
+          poll_interval=WATCH_POLL_INTERVAL, max_workers=WATCH_WORKERS))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(RESULTS_FILE):
+            stegano_io.export_results(RESULTS_FILE, EXCEL_FILE)
+
+
+def _run_sweep():
+    """Encode every image with every parameter combination and append the 
+       results to RESULTS_FILE.
+    """
     # Create list of all image paths in IMAGES_FOLDER folder.
-    image_paths = []
-    for root, dirs, files in os.walk(IMAGES_FOLDER):
-        for file in files:
-            if file.endswith((".jpg", ".jpeg", ".png")):
-                image_path = os.path.join(root, file)
-                image_paths.append(f"{image_path}")
-                
+    image_paths = sorted(stegano_ingest.scan_folder(IMAGES_FOLDER))
+    
+    if SAVE_POLICY != "none":
+        os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
+    
+    # Jobs finished by a previous (interrupted) run are skipped.
+    completed_jobs = stegano_io.load_completed_jobs(RESULTS_FILE)
+    image_paths = [
+      file for file in image_paths 
+      if any(stegano_io.job_key(file, colour_combination, bit_depth) 
+             not in completed_jobs 
+             for colour_combination in COLOUR_CHANNELS_LIST 
+             for bit_depth in BIT_DEPTH_LIST)]
+    
+    # Decode the next images and write results in the background while the
+    #
+    # current image is encoded and scored.
+    with stegano_io.BackgroundWriter(WRITE_QUEUE_DEPTH) as writer:
+        for file, original_image in stegano_io.prefetch_images(
+          image_paths, PREFETCH_DEPTH):
+            process_image_file(file, completed_jobs, original_image, writer)
+
+
+def _save_and_record(original_image, encoded_image, file, colour_combination,
+                     bit_depth, result_entry):
+    """Save the encoded image (if selected) and append its result entry.
+    """
+    if stegano_io.should_save(colour_combination, bit_depth, 
+                              SAVE_POLICY, SAVE_COMBINATIONS):
+        filename = os.path.basename(file)
+        output_path = os.path.join(
+          OUTPUT_DIRECTORY, f"{filename}_{colour_combination}_{bit_depth}")
+        with profiling.stage("save"):
+            stegano_io.save_encoded_image(
+              original_image, encoded_image, output_path, bit_depth, 
+              colour_combination, SAVE_CONTENT, PNG_COMPRESS_LEVEL)
+    
+    # Record the job once its encoded image has been saved.
+    stegano_io.append_result(RESULTS_FILE, result_entry)
+
+
+def process_image_file(file, completed_jobs=frozenset(), original_image=None,
+                       writer=None):
+    """Encode one image with every parameter combination, save the encoded
+       images and append the results to RESULTS_FILE. original_image can be
+       passed if it is already loaded, and writer (stegano_io.BackgroundWriter)
+       to save and record in the background.
+    """
     colour_combinations = COLOUR_CHANNELS_LIST
     bit_depths = BIT_DEPTH_LIST
-    results = []
+    original_array = None
     
     for colour_combination in colour_combinations:
-        for bit_depth in bit_depths:
-            for file in image_paths:
-                original_image = Image.open(str(file))
-                print(file, "+ processing bit depth =",bit_depth, 
-                      " colour channel/s =",colour_combination)
+        pending_depths = [
+          bit_depth for bit_depth in bit_depths 
+          if (stegano_io.job_key(file, colour_combination, bit_depth) 
+              not in completed_jobs)]
+        if not pending_depths:
+            continue
+        
+        # Load the image and score the original once per file.
+        if original_array is None:
+            with profiling.stage("load"):
+                if original_image is None:
+                    original_image = Image.open(str(file))
+                    original_image.load()
+                # The measures compare RGB arrays, so alpha and 16-bit
+                # carriers are scored on their 8-bit RGB version.
+                rgb_image = original_image.convert("RGB")
+                original_array = np.asarray(rgb_image)
                 
-                # Encode the image with each combination of parameters.
-                encoded_image = stegano.encode(original_image, contents, 
-                                               bit_depth, colour_combination)
-
-                # Calculate image quality measures.
-                mse = statistics.get_mse(original_image, encoded_image)
-                psnr = statistics.get_psnr(mse)
-                ssim = statistics.get_ssim(original_image, encoded_image)
-                entropy_original = statistics.get_entropy(original_image)
-                entropy_encoded = statistics.get_entropy(encoded_image)
+            # Moments of the original are shared by every encoding.
+            with profiling.stage("ssim"):
+                reference = statistics.get_reference_statistics(
+                  original_array)
+            with profiling.stage("entropy"):
+                histograms_original = histogram.channel_histograms(
+                  original_array)
+                entropy_original = str(round(float(
+                  histogram.entropy(histograms_original)), 3))
+            with profiling.stage("brisque"):
                 brisque_original = statistics.get_brisque(original_image)
+        
+        profiling.logger.info(
+          "%s + processing bit depths = %s colour channel/s = %s", 
+          file, pending_depths, colour_combination)
+        
+        # Encode the image with every bit depth in one pass.
+        with profiling.stage("encode"):
+            encoded_images = stegano.encode_depths(
+              rgb_image, contents, pending_depths, 
+              colour_combination)
+            encoded_arrays = np.stack(
+              [np.asarray(encoded_images[bit_depth]) 
+               for bit_depth in pending_depths])
+
+        # Calculate image quality measures of all depths together, only 
+        #
+        # the encoded channels are compared with the original.
+        with profiling.stage("ssim"):
+            sse_channels, ssim_channels = (
+              statistics.get_channel_statistics(
+                reference, encoded_arrays, colour_combination))
+            mse_values = sse_channels.sum(axis=1) / original_array.size
+            ssim_values = ssim_channels.mean(axis=1)
+        with profiling.stage("entropy"):
+            # Only the leading pixels holding the message are recounted.
+            entropy_values = []
+            for i, bit_depth in enumerate(pending_depths):
+                n_pixels = stegano.embedded_pixels(
+                  rgb_image, len(contents), bit_depth, colour_combination)
+                region = np.s_[:n_pixels // original_array.shape[1] + 1]
+                histograms_encoded = histogram.update_histograms(
+                  histograms_original, original_array[region], 
+                  encoded_arrays[i][region])
+                entropy_values.append(histogram.entropy(histograms_encoded))
+        
+        # Detectability of every depth; the most suspicious channel counts.
+        with profiling.stage("steganalysis"):
+            detection = {
+              name: scores.max(axis=1) 
+              for name, (scores, _) in steganalysis.analyse(
+                encoded_arrays, STEGANALYSIS_BLOCK_SIZE).items()}
+            
+        for i, bit_depth in enumerate(pending_depths):
+            encoded_image = encoded_images[bit_depth]
+            mse = str(round(float(mse_values[i]), 3))
+            psnr = statistics.get_psnr(mse)
+            with profiling.stage("msssim"):
+                msssim = statistics.get_msssim(original_array, 
+                                               encoded_arrays[i])
+            with profiling.stage("brisque"):
                 brisque_encoded = statistics.get_brisque(encoded_image)
-    
-                # Create a result entry with statistics and image details.
-                result_entry = {
-                    "ImageFile": file,
-                    "ColourCombination": colour_combination,
-                    "BitDepth": bit_depth,
-                    "PSNR": psnr,
-                    "MSE": mse,
-                    "SSIM": ssim,
-                    "EntropyOriginal": entropy_original,
-                    "EntropyEncoded": entropy_encoded,
-                    "BrisqueOriginal": brisque_original,
-                    "BrisqueEncoded": brisque_encoded,
-                }
-                
-                results.append(result_entry)
-                
-                filename = os.path.basename(file)
-                
-                # If the image is PNG format, save the encoded image as PNG.
-                if file[-3:] == "png": 
-                    output_filename = (
-                      f"{filename}_{colour_combination}_{bit_depth}.png")
-                    os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
-    
-                    # Save the image to the specified path
-                    output_path = os.path.join(OUTPUT_DIRECTORY, 
-                                               output_filename)
-                    encoded_image.save(output_path)
-                    
-                # If the image is JPG format, save the encoded image as JPG.
-                elif file[-3:] == "jpg":
-                        output_filename = (
-                          f"{filename}_{colour_combination}_{bit_depth}.jpg")
-                        os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
-        
-                        # Save the image to the specified path.
-                        output_path = os.path.join(OUTPUT_DIRECTORY, 
-                                                   output_filename)
-                        encoded_image.save(output_path)
-                        
-                # Otherwise, save the encoded image as JPEG.
-                elif file[-4:] == "jpeg":
-                    output_filename = (
-                      f"{filename}_{colour_combination}_{bit_depth}.jpeg")
-                    os.makedirs(OUTPUT_DIRECTORY, exist_ok=True)
-        
-                    # Save the image to the specified path.
-                    output_path = os.path.join(OUTPUT_DIRECTORY, 
-                                               output_filename)
-                    encoded_image.save(output_path)
-
-    df = pd.DataFrame(results)
-    
-    # Save the results to an Excel file.
-    df.to_excel(EXCEL_FILE, index=False)
-    
+
+            # Create a result entry with statistics and image details.
+            result_entry = {
+                "ImageFile": file,
+                "ColourCombination": colour_combination,
+                "BitDepth": bit_depth,
+                "PSNR": psnr,
+                "MSE": mse,
+                "SSIM": str(round(float(ssim_values[i]), 3)),
+                "MSSSIM": msssim,
+                "EntropyOriginal": entropy_original,
+                "EntropyEncoded": str(round(float(entropy_values[i]), 
+                                            3)),
+                "BrisqueOriginal": brisque_original,
+                "BrisqueEncoded": brisque_encoded,
+                "ChiSquareP": str(round(float(detection["ChiSquare"][i]), 3)),
+                "RSRate": str(round(float(detection["RS"][i]), 3)),
+                "SPARate": str(round(float(detection["SPA"][i]), 3)),
+            }
+            
+            write_job = (original_image, encoded_image, file, 
+                         colour_combination, bit_depth, result_entry)
+            if writer is not None:
+                writer.submit(_save_and_record, *write_job)
+            else:
+                _save_and_record(*write_job)
+        
+        if profiling.is_enabled():
+            profiling.logger.debug("%s", profiling.format_last_timings())
+
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL, format="%(message)s")
+    
     # Lorem Ipsum text file of substantial length so the full image is encoded.
     text_file_name = "Lorem_ipsum.txt"
 
@@ -799,6 +847,10 @@ if ACTIVATE_BUTTON == False:
     gui_compare.ShowDialog()
     gui_compare.MainLoop()
     
+elif WATCH_FOLDER:
+    # Transfer data of image quality measures of images arriving in a folder.
+    watch_folder_transfer()
+    
 else:
     # Transfer data of image quality measures of user-chosen images.
     excel_data_transfer()
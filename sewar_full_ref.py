@@ -2,8 +2,8 @@ from __future__ import absolute_import, division, print_function
 import numpy as np
 from scipy import signal
 from math import log2, log10
-from scipy.ndimage import generic_laplace,uniform_filter,correlate,gaussian_filter
-from utils import _initial_check, _get_sigmas, _get_sums, Filter, _replace_value, fspecial, filter2, _power_complex, _compute_bef
+from scipy.ndimage import correlate,gaussian_filter
+from utils import _initial_check, _get_sigmas, _get_sums, Filter, _replace_value, fspecial, filter2_channels, _integral_image, _window_sums, _power_complex, _compute_bef
 
 
 def mse (GT,P):
@@ -28,30 +28,42 @@ def rmse (GT,P):
 	GT,P = _initial_check(GT,P)
 	return np.sqrt(mse(GT,P))
 
-def _rmse_sw_single (GT,P,ws):	
-	errors = (GT-P)**2
-	errors = uniform_filter(errors.astype(np.float64),ws)
-	rmse_map = np.sqrt(errors)
-	s = int(np.round((ws/2)))
-	return np.mean(rmse_map[s:-s,s:-s]),rmse_map
+def _window_sizes(ws):
+	return list(ws) if isinstance(ws,(list,tuple)) else [ws]
+
+def _window_moments(images,ws,mode='reflect'):
+	"""calculates local means of (H,W,C) images for every window size in ws from one integral image.
+
+	:returns:  list (one entry per window size) of lists of (C,H,W) mean maps (one per image).
+	"""
+	channels = images[0].shape[2]
+	sizes = _window_sizes(ws)
+	pad = max(sizes)
+	sat = _integral_image(images,pad,mode)
+	return [[_window_sums(sat[i*channels:(i+1)*channels],size,pad,images[i].shape)/float(size**2)
+			for i in range(len(images))] for size in sizes]
+
+def _per_window_size(ws,values):
+	return values if isinstance(ws,(list,tuple)) else values[0]
 
 def rmse_sw (GT,P,ws=8):
 	"""calculates root mean squared error (rmse) using sliding window.
 
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
-	:param ws: sliding window size (default = 8).
+	:param ws: sliding window size, or list of sizes computed from one integral image (default = 8).
 
-	:returns:  tuple -- rmse value,rmse map.	
+	:returns:  tuple -- rmse value,rmse map (list of tuples if ws is a list).	
 	"""
 	GT,P = _initial_check(GT,P)
 
-	rmse_map = np.zeros(GT.shape)
-	vals = np.zeros(GT.shape[2])
-	for i in range(GT.shape[2]):
-		vals[i],rmse_map[:,:,i] = _rmse_sw_single (GT[:,:,i],P[:,:,i],ws) 
+	results = []
+	for size,(errors,) in zip(_window_sizes(ws),_window_moments([(GT-P)**2],ws)):
+		rmse_map = np.moveaxis(np.sqrt(errors),0,2)
+		s = int(np.round((size/2)))
+		results.append((np.mean(rmse_map[s:-s,s:-s]),rmse_map))
 
-	return np.mean(vals),rmse_map
+	return _per_window_size(ws,results)
 
 def psnr (GT,P,MAX=None):
 	"""calculates peak signal-to-noise ratio (psnr).
@@ -72,19 +84,8 @@ def psnr (GT,P,MAX=None):
 		return np.inf
 	return 10 * np.log10(MAX**2 /mse_value)
 
-def _uqi_single(GT,P,ws):
+def _uqi_map(GT_sum,P_sum,GT_sq_sum,P_sq_sum,GT_P_sum,ws):
 	N = ws**2
-	window = np.ones((ws,ws))
-
-	GT_sq = GT*GT
-	P_sq = P*P
-	GT_P = GT*P
-
-	GT_sum = uniform_filter(GT, ws)    
-	P_sum =  uniform_filter(P, ws)     
-	GT_sq_sum = uniform_filter(GT_sq, ws)  
-	P_sq_sum = uniform_filter(P_sq, ws)  
-	GT_P_sum = uniform_filter(GT_P, ws)
 
 	GT_P_sum_mul = GT_sum*P_sum
 	GT_P_sum_sq_sum_mul = GT_sum*GT_sum + P_sum*P_sum
@@ -97,21 +98,24 @@ def _uqi_single(GT,P,ws):
 	q_map[index] = 2*GT_P_sum_mul[index]/GT_P_sum_sq_sum_mul[index]
 	index = (denominator != 0)
 	q_map[index] = numerator[index]/denominator[index]
-
-	s = int(np.round(ws/2))
-	return np.mean(q_map[s:-s,s:-s])
+	return q_map
 
 def uqi (GT,P,ws=8):
 	"""calculates universal image quality index (uqi).
 
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
-	:param ws: sliding window size (default = 8).
+	:param ws: sliding window size, or list of sizes computed from one integral image (default = 8).
 
-	:returns:  float -- uqi value.
+	:returns:  float -- uqi value (list of values if ws is a list).
 	"""
 	GT,P = _initial_check(GT,P)
-	return np.mean([_uqi_single(GT[:,:,i],P[:,:,i],ws) for i in range(GT.shape[2])])
+
+	values = []
+	for size,moments in zip(_window_sizes(ws),_window_moments([GT,P,GT*GT,P*P,GT*P],ws)):
+		s = int(np.round(size/2))
+		values.append(np.mean(_uqi_map(*moments,size)[:,s:-s,s:-s]))
+	return _per_window_size(ws,values)
 
 def _ssim_single (GT,P,ws,C1,C2,fltr_specs,mode):
 	win = fspecial(**fltr_specs)
@@ -184,14 +188,10 @@ def ergas(GT,P,r=0.25):
 	ergasroot = np.sqrt( np.sum(div)/ nb )
 	return presratio*ergasroot
 
-def _scc_single(GT,P,win,ws):
-	def _scc_filter(inp, axis, output, mode, cval):
-		return correlate(inp, win , output, mode, cval, 0)
-
-	GT_hp = generic_laplace(GT.astype(np.float64), _scc_filter)
-	P_hp = generic_laplace(P.astype(np.float64), _scc_filter)
-	win = fspecial(Filter.UNIFORM,ws)
-	sigmaGT_sq,sigmaP_sq,sigmaGT_P = _get_sigmas(GT_hp,P_hp,win)
+def _scc_map(mu_GT,mu_P,sigmaGT_sq,sigmaP_sq,sigmaGT_P):
+	sigmaGT_sq -= mu_GT*mu_GT
+	sigmaP_sq -= mu_P*mu_P
+	sigmaGT_P -= mu_GT*mu_P
 
 	sigmaGT_sq[sigmaGT_sq<0] = 0
 	sigmaP_sq[sigmaP_sq<0] = 0
@@ -209,16 +209,20 @@ def scc(GT,P,win=[[-1,-1,-1],[-1,8,-1],[-1,-1,-1]],ws=8):
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
 	:param fltr: high pass filter for spatial processing (default=[[-1,-1,-1],[-1,8,-1],[-1,-1,-1]]).
-	:param ws: sliding window size (default = 8).
+	:param ws: sliding window size, or list of sizes computed from one integral image (default = 8).
 
-	:returns:  float -- scc value.
+	:returns:  float -- scc value (list of values if ws is a list).
 	"""
 	GT,P = _initial_check(GT,P)
 
-	coefs = np.zeros(GT.shape)
-	for i in range(GT.shape[2]):
-		coefs[:,:,i] = _scc_single(GT[:,:,i],P[:,:,i],win,ws)
-	return np.mean(coefs)
+	# generic_laplace with this filter adds the correlation once per image axis
+	win = np.asarray(win,dtype=np.float64)[:,:,np.newaxis]
+	GT_hp = 2*correlate(GT,win,mode='reflect')
+	P_hp = 2*correlate(P,win,mode='reflect')
+
+	# local moments with zero padding like filter2 'same'
+	moments = _window_moments([GT_hp,P_hp,GT_hp*GT_hp,P_hp*P_hp,GT_hp*P_hp],ws,mode='constant')
+	return _per_window_size(ws,[np.mean(_scc_map(*m)) for m in moments])
 
 
 def rase(GT,P,ws=8):
@@ -226,23 +230,26 @@ def rase(GT,P,ws=8):
 
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
-	:param ws: sliding window size (default = 8).
+	:param ws: sliding window size, or list of sizes computed from one integral image (default = 8).
 
-	:returns:  float -- rase value.
+	:returns:  float -- rase value (list of values if ws is a list).
 	"""
 	GT,P = _initial_check(GT,P)
 
-	_,rmse_map = rmse_sw(GT,P,ws)
-
-	GT_means = uniform_filter(GT, ws)/ws**2
+	N = GT.shape[2]
 
+	# squared errors and GT share one integral image
+	values = []
+	for size,(errors,GT_means) in zip(_window_sizes(ws),_window_moments([(GT-P)**2,GT],ws)):
+		rmse_map = np.sqrt(errors)
+		GT_means = GT_means/size**2
 
-	N = GT.shape[2]
-	M = np.sum(GT_means,axis=2)/N
-	rase_map = (100./M) * np.sqrt( np.sum(rmse_map**2,axis=2) / N )
+		M = np.sum(GT_means,axis=0)/N
+		rase_map = (100./M) * np.sqrt( np.sum(rmse_map**2,axis=0) / N )
 
-	s = int(np.round(ws/2))
-	return np.mean(rase_map[s:-s,s:-s])
+		s = int(np.round(size/2))
+		values.append(np.mean(rase_map[s:-s,s:-s]))
+	return _per_window_size(ws,values)
 
 
 def sam (GT,P):
@@ -268,16 +275,24 @@ def sam (GT,P):
 
 
 
-def msssim (GT,P,weights = [0.0448, 0.2856, 0.3001, 0.2363, 0.1333],ws=11,K1=0.01,K2=0.03,MAX=None):
+def _box_downsample(img):
+	"""halves an image like uniform_filter(img,(2,2,1))[::2,::2], averaging only the kept pixels."""
+	rows = np.arange(0,img.shape[0],2)
+	img = (img[rows] + img[np.maximum(rows-1,0)]) / 2
+	cols = np.arange(0,img.shape[1],2)
+	return (img[:,cols] + img[:,np.maximum(cols-1,0)]) / 2
+
+def msssim (GT,P,weights = [0.0448, 0.2856, 0.3001, 0.2363, 0.1333],ws=11,K1=0.01,K2=0.03,MAX=None,backend='separable'):
 	"""calculates multi-scale structural similarity index (ms-ssim).
 
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
-	:param weights: weights for each scale (default = [0.0448, 0.2856, 0.3001, 0.2363, 0.1333]).
-	:param ws: sliding window size (default = 11).
+	:param weights: weights for each scale, scales smaller than ws are dropped and the rest renormalised (default = [0.0448, 0.2856, 0.3001, 0.2363, 0.1333]).
+	:param ws: sliding window size, at most the shorter image side (default = 11).
 	:param K1: First constant for SSIM (default = 0.01).
 	:param K2: Second constant for SSIM (default = 0.03).
 	:param MAX: Maximum value of datarange (if None, MAX is calculated using image dtype).
+	:param backend: filter backend, 'separable', 'fft' or 'convolve2d' (default = 'separable').
 
 	:returns:  float -- ms-ssim value.
 	"""
@@ -286,80 +301,123 @@ def msssim (GT,P,weights = [0.0448, 0.2856, 0.3001, 0.2363, 0.1333],ws=11,K1=0.0
 
 	GT,P = _initial_check(GT,P)
 
-	scales = len(weights)
-
-	fltr_specs = dict(fltr=Filter.GAUSSIAN,sigma=1.5,ws=11)
-
 	if isinstance(weights, list):
 		weights = np.array(weights)
 
-	mssim = []
-	mcs = []
-	for _ in range(scales):
-		_ssim, _cs = ssim(GT, P, ws=ws,K1=K1,K2=K2,MAX=MAX,fltr_specs=fltr_specs)
-		mssim.append(_ssim)
-		mcs.append(_cs)
+	# scales whose shorter side drops below the window are left out and the remaining weights renormalised,
+	# an image smaller than the window at the finest scale gets a smaller window
+	side = min(GT.shape[:2])
+	ws = min(ws,side)
+	scales = 1
+	while scales < len(weights) and -(-side // 2**scales) >= ws:
+		scales += 1
+	if scales < len(weights):
+		weights = weights[:scales] / weights[:scales].sum()
+	channels = GT.shape[2]
 
-		filtered = [uniform_filter(im, 2) for im in [GT, P]]
-		GT, P = [x[::2, ::2, :] for x in filtered]
+	win = fspecial(Filter.GAUSSIAN,ws=ws,sigma=1.5)
+
+	C1 = (K1*MAX)**2
+	C2 = (K2*MAX)**2
+
+	mcs = []
+	for scale in range(scales):
+		# moments of all channels of GT and P in one filter pass
+		stack = np.concatenate([GT, P, GT*GT, P*P, GT*P], axis=2)
+		moments = filter2_channels(stack,win,'valid',backend)
+		mu_GT,mu_P,GT_sq,P_sq,GT_P = [moments[:,:,i*channels:(i+1)*channels] for i in range(5)]
+
+		GT_sum_sq = mu_GT*mu_GT
+		P_sum_sq = mu_P*mu_P
+		GT_P_sum_mul = mu_GT*mu_P
+		sigmaGT_sq = GT_sq - GT_sum_sq
+		sigmaP_sq = P_sq - P_sum_sq
+		sigmaGT_P = GT_P - GT_P_sum_mul
+
+		cs_map = (2*sigmaGT_P + C2)/(sigmaGT_sq + sigmaP_sq + C2)
+		if scale == scales - 1:
+			# luminance term only enters at the coarsest scale
+			mssim = np.mean((2*GT_P_sum_mul + C1)/(GT_sum_sq + P_sum_sq + C1)*cs_map)
+			break
+		mcs.append(np.mean(cs_map))
+
+		GT, P = _box_downsample(GT), _box_downsample(P)
 
-	mssim = np.array(mssim,dtype=np.float64)
 	mcs = np.array(mcs,dtype=np.float64)
 
-	return np.prod(_power_complex(mcs[:scales-1],weights[:scales-1])) * _power_complex(mssim[scales-1],weights[scales-1])
+	return np.prod(_power_complex(mcs,weights[:scales-1])) * _power_complex(mssim,weights[scales-1])
 
 
-def _vifp_single(GT,P,sigma_nsq):
+def _vifp_channels(GT,P,sigma_nsq,backend):
+	"""calculates the vif-p numerator and denominator of every channel of (H,W,C) images."""
 	EPS = 1e-10
-	num =0.0
-	den =0.0
+	channels = GT.shape[2]
+	num = np.zeros(channels)
+	den = np.zeros(channels)
 	for scale in range(1,5):
 		N=2.0**(4-scale+1)+1
-		win = fspecial(Filter.GAUSSIAN,ws=N,sigma=N/5)
+		win = fspecial(Filter.GAUSSIAN,ws=int(N),sigma=N/5)
 
 		if scale >1:
-			GT = filter2(GT,win,'valid')[::2, ::2]
-			P = filter2(P,win,'valid')[::2, ::2]
-
-		GT_sum_sq,P_sum_sq,GT_P_sum_mul = _get_sums(GT,P,win,mode='valid')
-		sigmaGT_sq,sigmaP_sq,sigmaGT_P = _get_sigmas(GT,P,win,mode='valid',sums=(GT_sum_sq,P_sum_sq,GT_P_sum_mul))
-
-
-		sigmaGT_sq[sigmaGT_sq<0]=0
-		sigmaP_sq[sigmaP_sq<0]=0
-
-		g=sigmaGT_P /(sigmaGT_sq+EPS)
-		sv_sq=sigmaP_sq-g*sigmaGT_P
-		
-		g[sigmaGT_sq<EPS]=0
-		sv_sq[sigmaGT_sq<EPS]=sigmaP_sq[sigmaGT_sq<EPS]
-		sigmaGT_sq[sigmaGT_sq<EPS]=0
-		
-		g[sigmaP_sq<EPS]=0
-		sv_sq[sigmaP_sq<EPS]=0
-		
-		sv_sq[g<0]=sigmaP_sq[g<0]
-		g[g<0]=0
-		sv_sq[sv_sq<=EPS]=EPS
-		
-	
-		num += np.sum(np.log10(1.0+(g**2.)*sigmaGT_sq/(sv_sq+sigma_nsq)))
-		den += np.sum(np.log10(1.0+sigmaGT_sq/sigma_nsq))
-
-	return num/den
-
-def vifp(GT,P,sigma_nsq=2):
+			filtered = filter2_channels(np.concatenate([GT,P],axis=2),win,'valid',backend)[::2, ::2]
+			GT,P = filtered[:,:,:channels],filtered[:,:,channels:]
+
+		# local means and (co)variances of all channels in one filter pass
+		moments = filter2_channels(np.concatenate([GT,P,GT*GT,P*P,GT*P],axis=2),win,'valid',backend)
+		mu_GT,mu_P,sigmaGT_sq,sigmaP_sq,sigmaGT_P = [moments[:,:,i*channels:(i+1)*channels] for i in range(5)]
+		sigmaGT_sq -= mu_GT*mu_GT
+		sigmaP_sq -= mu_P*mu_P
+		mu_GT *= mu_P
+		sigmaGT_P -= mu_GT
+
+		np.maximum(sigmaGT_sq,0,out=sigmaGT_sq)
+		np.maximum(sigmaP_sq,0,out=sigmaP_sq)
+
+		g = sigmaGT_P/(sigmaGT_sq+EPS)
+		sv_sq = g*sigmaGT_P
+		np.subtract(sigmaP_sq,sv_sq,out=sv_sq)
+
+		mask = sigmaGT_sq<EPS
+		g[mask] = 0
+		np.copyto(sv_sq,sigmaP_sq,where=mask)
+		sigmaGT_sq[mask] = 0
+
+		mask = sigmaP_sq<EPS
+		g[mask] = 0
+		sv_sq[mask] = 0
+
+		mask = g<0
+		np.copyto(sv_sq,sigmaP_sq,where=mask)
+		g[mask] = 0
+		sv_sq[sv_sq<=EPS] = EPS
+
+		# reuse the filtered buffers for the information terms
+		np.multiply(g,g,out=g)
+		g *= sigmaGT_sq
+		sv_sq += sigma_nsq
+		g /= sv_sq
+		g += 1.0
+		num += np.sum(np.log10(g,out=g),axis=(0,1))
+
+		sigmaGT_sq /= sigma_nsq
+		sigmaGT_sq += 1.0
+		den += np.sum(np.log10(sigmaGT_sq,out=sigmaGT_sq),axis=(0,1))
+
+	return num,den
+
+def vifp(GT,P,sigma_nsq=2,backend='separable'):
 	"""calculates Pixel Based Visual Information Fidelity (vif-p).
 
 	:param GT: first (original) input image.
 	:param P: second (deformed) input image.
 	:param sigma_nsq: variance of the visual noise (default = 2)
+	:param backend: filter backend, 'separable', 'fft' or 'convolve2d' (default = 'separable').
 
 	:returns:  float -- vif-p value.
 	"""
 	GT,P = _initial_check(GT,P)
-	# GT,P = GT[:,:,np.newaxis],P[:,:,np.newaxis]
-	return np.mean([_vifp_single(GT[:,:,i],P[:,:,i],sigma_nsq) for i in range(GT.shape[2])])
+	num,den = _vifp_channels(GT,P,sigma_nsq,backend)
+	return np.mean(num/den)
 
 
 def psnrb(GT, P):
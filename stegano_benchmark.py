@@ -0,0 +1,341 @@
+"""Benchmarks for encoding, decoding and the image quality measures.
+
+Run this file directly. Every case is timed on synthetic images, the
+results are appended to HISTORY_FILE and compared against BASELINE_FILE.
+Cases which got slower than the baseline by more than REGRESSION_TOLERANCE
+are reported and the script exits with status 1.
+"""
+import json
+import os
+import platform
+import string
+import sys
+import time
+import tracemalloc
+import numpy as np
+from PIL import Image
+import stegano_functions as stegano
+import stegano_statistics as statistics
+import stegano_histogram as histogram
+import stegano_steganalysis as steganalysis
+import sewar_full_ref as sewar
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the process peak RSS is then not recorded.
+    resource = None
+
+### Change the following parameters to select the benchmark cases
+
+# Image sizes in megapixels (0.16 MP is the 400 x 400 GUI preview).
+RESOLUTIONS_MP = [0.16, 2, 12, 50]
+
+# Colour channels and bit depths used for encode/decode cases.
+COLOUR_CHANNELS_LIST = list(stegano.CHANNEL_SETS)
+BIT_DEPTH_LIST = list(stegano.BIT_DEPTHS)
+
+# Payload sizes as a fraction of the image capacity.
+PAYLOAD_FRACTIONS = [0.01, 0.5, 1.0]
+
+# Image quality measures and detectors: name -> function(sweep) taking the
+# inputs of sweep_inputs(). The first ones are the calls of
+# main_program.process_image_file() for every bit depth of BIT_DEPTH_LIST,
+# the sewar ones compare the 1-bit encoding with the original.
+METRICS = {
+    "get_reference_statistics": lambda sweep: (
+      statistics.get_reference_statistics(sweep["original"])),
+    "get_channel_statistics": lambda sweep: (
+      statistics.get_channel_statistics(sweep["reference"], sweep["encoded"],
+                                        "RGB")),
+    "get_msssim": lambda sweep: [
+      statistics.get_msssim(sweep["original"], encoded)
+      for encoded in sweep["encoded"]],
+    "histogram.entropy": lambda sweep: sweep_entropy(sweep),
+    "steganalysis.analyse": lambda sweep: steganalysis.analyse(
+      sweep["encoded"]),
+    "get_brisque": lambda sweep: [
+      statistics.get_brisque(encoded) for encoded in sweep["encoded"]],
+    "sewar.mse": lambda sweep: sewar.mse(sweep["original"],
+                                         sweep["encoded"][0]),
+    "sewar.psnr": lambda sweep: sewar.psnr(sweep["original"],
+                                           sweep["encoded"][0]),
+    "sewar.uqi": lambda sweep: sewar.uqi(sweep["original"],
+                                         sweep["encoded"][0]),
+    "sewar.vifp": lambda sweep: sewar.vifp(sweep["original"],
+                                           sweep["encoded"][0]),
+}
+
+# Image sides in pixels, or (height, width), on which the filter backends
+# of the sewar measures are compared (below 176 px the coarsest ms-ssim
+# scale is smaller than its 11 px window).
+BACKEND_CHECK_SIDES = [24, 64, 100, 175, 176, 200, (150, 300), (200, 160)]
+BACKEND_TOLERANCE = 1e-6
+
+# Number of timed runs per case (latency percentiles are taken over these).
+REPEATS = 3
+
+# JSON file every benchmark run is appended to.
+HISTORY_FILE = "benchmark_history.json"
+
+# JSON file with the reference run. It is created from the current run if
+# it does not exist or if UPDATE_BASELINE = True.
+BASELINE_FILE = "benchmark_baseline.json"
+UPDATE_BASELINE = False
+
+# Allowed slowdown of the median latency before a case is reported.
+REGRESSION_TOLERANCE = 0.10
+
+
+def synthetic_image(megapixels, seed=0):
+    """Create a square test image with smooth gradients, edges and noise.
+    """
+    side = int(round(np.sqrt(megapixels * 1e6)))
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:side, 0:side] / max(side - 1, 1)
+    pixels = np.empty((side, side, 3), dtype=np.float64)
+    pixels[:, :, 0] = 255 * x
+    pixels[:, :, 1] = 255 * y
+    pixels[:, :, 2] = 127.5 * (1 + np.sin(12 * np.pi * x * y))
+    pixels[side // 4:side // 2, side // 4:side // 2] = (200, 40, 40)
+    pixels += rng.normal(0, 8, pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def synthetic_payload(n_bytes, seed=0):
+    """Create a random text payload of n_bytes characters.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.frombuffer((string.ascii_letters + " ").encode(), np.uint8)
+    return rng.choice(letters, n_bytes).tobytes().decode("ascii")
+
+
+def sweep_inputs(original_image, payload, bit_depths=BIT_DEPTH_LIST):
+    """ Function to prepare the inputs the sweep scores, like
+        main_program.process_image_file() does for one image and the "RGB"
+        colour channels.
+        Parameters:
+            original_image - RGB image
+            payload - secret data encoded with every bit depth
+            bit_depths - bit depths encoded at once
+    return dictionary with the original array and image, the (B, H, W, C)
+           encoded arrays, the reference statistics and histograms of the
+           original and the payload length
+    """
+    original = np.asarray(original_image)
+    encoded_images = stegano.encode_depths(original_image, payload,
+                                           bit_depths, "RGB")
+    return {
+        "image": original_image,
+        "original": original,
+        "encoded": np.stack([np.asarray(encoded_images[bit_depth])
+                             for bit_depth in bit_depths]),
+        "bit_depths": list(bit_depths),
+        "reference": statistics.get_reference_statistics(original),
+        "histograms": histogram.channel_histograms(original),
+        "payload_length": len(payload),
+    }
+
+
+def sweep_entropy(sweep):
+    """Calculate the entropy of every encoding by recounting only the
+       leading pixels holding the message, as the sweep does.
+    """
+    original = sweep["original"]
+    entropy_values = []
+    for encoded, bit_depth in zip(sweep["encoded"], sweep["bit_depths"]):
+        n_pixels = stegano.embedded_pixels(
+          sweep["image"], sweep["payload_length"], bit_depth, "RGB")
+        region = np.s_[:n_pixels // original.shape[1] + 1]
+        entropy_values.append(histogram.entropy(histogram.update_histograms(
+          sweep["histograms"], original[region], encoded[region])))
+    return entropy_values
+
+
+def measure(function, repeats=REPEATS):
+    """ Function to time a benchmark case.
+        Parameters:
+            function - callable without arguments
+            repeats - number of timed runs
+    return dictionary with latency percentiles (seconds) and peak traced
+           memory
+    """
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+
+    # Memory is traced in an extra run so tracing does not affect timing.
+    tracemalloc.start()
+    function()
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p90": float(np.percentile(latencies, 90)),
+        "latency_max": float(np.max(latencies)),
+        "peak_traced_mb": peak_traced / 2**20,
+    }
+
+
+def peak_rss_mb():
+    """Read the peak resident memory of the process so far. It cannot be
+       reset, so it is recorded once per run and not per case.
+
+        return megabytes or None if resource is not available
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (2**20 if sys.platform == "darwin" else 2**10)
+
+
+def run_benchmarks():
+    """ Function to run every benchmark case.
+    return dictionary {case name: measurement}
+    """
+    results = {}
+    for megapixels in RESOLUTIONS_MP:
+        original_image = synthetic_image(megapixels)
+        pixels = original_image.width * original_image.height / 1e6
+
+        for colour_combination in COLOUR_CHANNELS_LIST:
+            # The sweep encodes every bit depth at once.
+            n_bytes = stegano.capacity(original_image, max(BIT_DEPTH_LIST),
+                                       colour_combination)
+            for fraction in PAYLOAD_FRACTIONS:
+                payload = synthetic_payload(int(n_bytes * fraction))
+                result = measure(lambda: stegano.encode_depths(
+                  original_image, payload, BIT_DEPTH_LIST,
+                  colour_combination))
+                result["mp_per_s"] = pixels / result["latency_p50"]
+                results[f"encode_depths/{megapixels}MP/"
+                        f"{colour_combination}/{fraction}"] = result
+
+            for bit_depth in BIT_DEPTH_LIST:
+                n_bytes = stegano.capacity(original_image, bit_depth,
+                                           colour_combination)
+                for fraction in PAYLOAD_FRACTIONS:
+                    payload = synthetic_payload(int(n_bytes * fraction))
+                    case = (f"{megapixels}MP/{colour_combination}/"
+                            f"{bit_depth}/{fraction}")
+
+                    result = measure(lambda: stegano.encode(
+                      original_image, payload, bit_depth, colour_combination))
+                    result["mp_per_s"] = pixels / result["latency_p50"]
+                    results["encode/" + case] = result
+
+                    encoded_image = stegano.encode(
+                      original_image, payload, bit_depth, colour_combination)
+                    result = measure(lambda: stegano.decode(
+                      encoded_image, bit_depth, colour_combination))
+                    result["mp_per_s"] = pixels / result["latency_p50"]
+                    results["decode/" + case] = result
+
+        # The measures hardly depend on the encoding parameters.
+        sweep = sweep_inputs(original_image, synthetic_payload(
+          stegano.capacity(original_image, 1, "RGB")))
+        for name, metric in METRICS.items():
+            result = measure(lambda: metric(sweep))
+            result["mp_per_s"] = pixels / result["latency_p50"]
+            results[f"{name}/{megapixels}MP"] = result
+    return results
+
+
+def check_backends(sides=BACKEND_CHECK_SIDES, tolerance=BACKEND_TOLERANCE):
+    """ Function to compare the filter backends of sewar.msssim and
+        sewar.vifp on small images.
+        Parameters:
+            sides - image sides in pixels or (height, width) tuples
+            tolerance - allowed absolute difference to the 'convolve2d'
+                        backend
+    return list of (case, reference value, value) tuples which differ
+    """
+    mismatches = []
+    for side in sides:
+        height, width = side if isinstance(side, tuple) else (side, side)
+        original = np.asarray(synthetic_image(
+          max(height, width)**2 / 1e6))[:height, :width]
+        encoded = original ^ np.random.default_rng(height * width).integers(
+          0, 2, original.shape, dtype=np.uint8)
+        for name, metric in (("msssim", sewar.msssim), ("vifp", sewar.vifp)):
+            reference = metric(original, encoded, backend="convolve2d")
+            for backend in ("separable", "fft"):
+                value = metric(original, encoded, backend=backend)
+                if not abs(value - reference) <= tolerance:
+                    mismatches.append((f"{name}/{backend}/{height}x{width}px",
+                                       reference, value))
+    return mismatches
+
+
+def find_regressions(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """ Function to compare benchmark results against a baseline run.
+        Parameters:
+            results - dictionary returned by run_benchmarks()
+            baseline - results of the baseline run
+            tolerance - allowed relative slowdown of the median latency
+    return list of (case, baseline latency, current latency) tuples
+    """
+    regressions = []
+    for case, result in results.items():
+        if case not in baseline:
+            continue
+        reference = baseline[case]["latency_p50"]
+        if result["latency_p50"] > reference * (1 + tolerance):
+            regressions.append((case, reference, result["latency_p50"]))
+    return regressions
+
+
+def _load_json(file_path, default):
+    """Read a JSON file or return default if it does not exist.
+    """
+    if not os.path.exists(file_path):
+        return default
+    with open(file_path) as f:
+        return json.load(f)
+
+
+def _write_json(file_path, data):
+    """Write a JSON file atomically.
+    """
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(temporary_path, file_path)
+
+
+if __name__ == "__main__":
+    mismatches = check_backends()
+    for case, reference, value in mismatches:
+        print(f"BACKEND MISMATCH {case}: {reference} != {value}")
+    if mismatches:
+        sys.exit(1)
+
+    results = run_benchmarks()
+    run = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "peak_rss_mb": peak_rss_mb(),
+        "results": results,
+    }
+
+    history = _load_json(HISTORY_FILE, [])
+    history.append(run)
+    _write_json(HISTORY_FILE, history)
+
+    baseline = _load_json(BASELINE_FILE, None)
+    if baseline is None or UPDATE_BASELINE:
+        _write_json(BASELINE_FILE, run)
+        print("Baseline written to", BASELINE_FILE)
+        sys.exit(0)
+
+    regressions = find_regressions(results, baseline["results"])
+    for case, reference, latency in regressions:
+        print(f"REGRESSION {case}: {reference:.4f} s -> {latency:.4f} s")
+    print(len(results), "cases,", len(regressions), "regressions")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,95 @@
+"""Error-correcting code for embedded data.
+
+Extended Hamming(8,4) code (SECDED): every 4 data bits become an 8-bit
+codeword, which corrects one flipped bit and detects two. Encoding and
+decoding are table lookups on whole NumPy arrays. The 8 codewords of every
+block of BLOCK_BYTES data bytes are bit-interleaved, so the bits flipped by
+one changed sample (at most 8 consecutive bits of the carrier stream) hit
+every codeword at most once.
+"""
+import numpy as np
+import stegano_profiling as profiling
+
+# Data bytes per interleaved block and the bytes stored for them.
+BLOCK_BYTES = 4
+CODE_BLOCK_BYTES = 8
+
+# Generator matrix: data bits d1 d2 d3 d4 -> codeword bits p1 p2 d1 p3 d2 d3
+# d4 p0 (Hamming(7,4) plus the overall parity bit p0).
+GENERATOR = np.array([[1, 1, 1, 0, 0, 0, 0, 1],
+                      [1, 0, 0, 1, 1, 0, 0, 1],
+                      [0, 1, 0, 1, 0, 1, 0, 1],
+                      [1, 1, 0, 1, 0, 0, 1, 0]], dtype=np.uint8)
+
+# Codeword of every nibble.
+CODEWORDS = np.packbits(
+  np.unpackbits(np.arange(16, dtype=np.uint8)[:, np.newaxis], axis=1)[:, 4:]
+  @ GENERATOR % 2, axis=1)[:, 0]
+
+# Nearest nibble of every received byte and its number of flipped bits (2
+# means uncorrectable: two codewords are equally near).
+_distances = np.unpackbits(
+  (np.arange(256, dtype=np.uint8)[:, np.newaxis] ^ CODEWORDS)[..., np.newaxis],
+  axis=2).sum(axis=2)
+DECODED = np.argmin(_distances, axis=1).astype(np.uint8)
+ERRORS = _distances.min(axis=1)
+
+# Every byte value spread over the top bits of the 8 bytes of a big-endian
+# uint64 (bit k of the value -> bit 7 of byte k), for the interleaving.
+SPREAD = (np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis],
+                        axis=1).astype(np.uint64)
+          << (np.uint64(7) + np.uint64(8) * np.arange(7, -1, -1,
+                                                      dtype=np.uint64))
+          ).sum(axis=1, dtype=np.uint64)
+SPREAD_CODEWORDS = SPREAD[CODEWORDS]
+
+
+def encoded_size(n_bytes):
+    """Number of bytes stored for n_bytes data bytes
+    """
+    return -(-n_bytes // BLOCK_BYTES) * CODE_BLOCK_BYTES
+
+
+def _interleave(blocks, spread=SPREAD):
+    """Transpose the 8 x 8 bit matrix of every block (its own inverse):
+       byte k of a block collects bit k of its 8 values. spread maps the 
+       block values to their SPREAD entries (SPREAD_CODEWORDS for nibbles).
+    """
+    result = np.zeros(len(blocks), dtype=np.uint64)
+    for column in range(8):
+        result |= spread[blocks[:, column]] >> np.uint64(column)
+    return result.astype(">u8").view(np.uint8).reshape(-1, 8)
+
+
+def encode(data):
+    """ Function to add the error-correcting code to data.
+        Parameters:
+            data - bytes, padded with zeros to a multiple of BLOCK_BYTES
+    return encoded bytes (see encoded_size())
+    """
+    values = np.zeros(encoded_size(len(data)) // 2, dtype=np.uint8)
+    values[:len(data)] = np.frombuffer(bytes(data), dtype=np.uint8)
+    nibbles = np.stack([values >> 4, values & 15], axis=1)
+    return _interleave(nibbles.reshape(-1, 8), SPREAD_CODEWORDS).tobytes()
+
+
+def decode(data):
+    """ Function to correct and remove the error-correcting code. Corrected
+        codewords are counted as "ecc_corrected" (see stegano_profiling),
+        uncorrectable ones are logged.
+        Parameters:
+            data - bytes returned by encode(), a multiple of
+                   CODE_BLOCK_BYTES
+    return data bytes (including the padding of encode())
+    """
+    codewords = _interleave(
+      np.frombuffer(bytes(data), dtype=np.uint8).reshape(-1, 8)).ravel()
+    errors = ERRORS[codewords]
+    profiling.count("ecc_corrected", int(np.count_nonzero(errors == 1)))
+    n_uncorrectable = int(np.count_nonzero(errors > 1))
+    if n_uncorrectable:
+        profiling.logger.warning("%d codewords could not be corrected.",
+                                 n_uncorrectable)
+
+    nibbles = DECODED[codewords].reshape(-1, 2)
+    return ((nibbles[:, 0] << 4) | nibbles[:, 1]).tobytes()
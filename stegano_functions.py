@@ -2,8 +2,77 @@
 https://github.com/x4nth055/pythoncode-tutorials/blob/master/ethical-hacking/
 steganography/steganography.py
 """
+import hashlib
+import itertools
 import numpy as np
-import PIL
+from PIL import Image
+import stegano_ecc
+import stegano_profiling as profiling
+
+logger = profiling.logger
+
+# Colour channel combinations and bit depths offered by the tool.
+CHANNEL_SETS = ("RGB", "R", "G", "B", "RG", "RB", "GB")
+BIT_DEPTHS = (1, 2, 3, 4, 5, 6, 7)
+
+# Image modes encoded without conversion and their channel letters ("A" is
+# the alpha channel, "L" the grey channel). "I;16*" and "I" are 16-bit grey.
+NATIVE_MODES = {"RGB": "RGB", "RGBA": "RGBA", "L": "L", "LA": "LA",
+                "I;16": "L", "I;16L": "L", "I;16B": "L", "I": "L"}
+
+# Stopping criteria appended to the secret data.
+TERMINATOR = "====="
+
+# Number of bytes read at once by decode() while looking for TERMINATOR and
+#
+# written at once by embed_stream().
+DECODE_CHUNK_BYTES = 1 << 16
+
+# Ways of hiding the message bits in the carrier bits: "replace" overwrites
+#
+# them, "matrix" uses matrix embedding (see _matrix_embed()) and "matching"
+# moves each value to the nearest one with the message bits (see _match()).
+EMBEDDINGS = ("replace", "matrix", "matching")
+
+# Largest number of message bits hidden in one group of 2^k - 1 carrier bits
+#
+# by matrix embedding.
+MATRIX_MAX_BITS = 8
+
+# Number of bytes read for every candidate setting by detect_parameters().
+PROBE_BYTES = 64
+
+# Lowest probe score accepted as a message (see _probe_scores()).
+MIN_PROBE_SCORE = 1.0
+
+# Approximate share of the most common characters in English text.
+TEXT_FREQUENCIES = {
+    " ": 0.17, "e": 0.1, "t": 0.07, "a": 0.065, "o": 0.06, "i": 0.057, 
+    "n": 0.057, "s": 0.053, "r": 0.05, "h": 0.045, "l": 0.033, "d": 0.033, 
+    "c": 0.024, "u": 0.023, "m": 0.02, "f": 0.018, "p": 0.016, "g": 0.016, 
+    "w": 0.015, "y": 0.014, "b": 0.012, ".": 0.009, ",": 0.009, "v": 0.008, 
+    "k": 0.006, "\n": 0.005, "x": 0.0015, "j": 0.001, "q": 0.001, 
+    "z": 0.0007}
+
+# Bits of evidence for text given by every byte value: log2 of its 
+#
+# probability in text (TEXT_FREQUENCIES, small shares for other printable
+# and other byte values) over its probability in random data (1 / 256).
+_text_probabilities = np.full(256, 1e-6)
+_text_probabilities[32:127] = 2e-4
+_text_probabilities[[ord(c) for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]] = 2e-3
+for _character, _share in TEXT_FREQUENCIES.items():
+    _text_probabilities[ord(_character)] = _share
+TEXT_LOG_ODDS = np.log2(256 * _text_probabilities 
+                        / _text_probabilities.sum())
+
+# Score added when the stopping criteria is found (more than any byte).
+TERMINATOR_SCORE = 8
+
+# Longest byte period of the bits read from a flat region of an 8-bit image
+#
+# (up to 4 channels x 7 bits per pixel repeat after at most 7 bytes).
+MAX_PROBE_PERIOD = 7
 
 def int2bin(number):
     """Convert number to binary format
@@ -24,7 +93,583 @@ def to_bin(data):
         raise TypeError("Type not supported.")
         
         
-def encode(original_image, secret_data, n_bits = 1, color_channels="RGB"):
+def _count_channels(color_channels, bands="RGBAL"):
+    """Count how many of the image channels (bands) are used
+    """
+    return sum(band in color_channels.upper() for band in bands)
+
+
+def _image_bands(image):
+    """Find the channel letters an image is encoded with (see NATIVE_MODES)
+    """
+    if image.mode in NATIVE_MODES:
+        return NATIVE_MODES[image.mode]
+    return "RGBA" if _has_alpha(image) else "RGB"
+
+
+def _has_alpha(image):
+    """Check if an image which needs conversion carries transparency
+    """
+    return "A" in image.getbands() or "transparency" in image.info
+
+
+def _carrier_pixels(image):
+    """ Function to convert an image to a pixel array without losing alpha
+        or 16-bit precision. Modes not in NATIVE_MODES are converted to RGB
+        (RGBA if they carry transparency).
+    return (H, W, C) uint8 or uint16 array and channel letters
+    """
+    if image.mode not in NATIVE_MODES:
+        image = image.convert("RGBA" if _has_alpha(image) else "RGB")
+    pixels = np.array(image)
+    
+    if image.mode == "I":
+        # 16-bit PNGs may open as 32-bit integer mode.
+        if pixels.min() < 0 or pixels.max() > np.iinfo(np.uint16).max:
+            raise ValueError("Only 8-bit and 16-bit images are supported.")
+        pixels = pixels.astype(np.uint16)
+    elif image.mode.startswith("I;16"):
+        pixels = pixels.astype(np.uint16)
+    
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, np.newaxis]
+    return pixels, NATIVE_MODES[image.mode]
+
+
+def _array_bands(pixels):
+    """Guess the channel letters of a pixel array from its channel count
+    """
+    return {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}[pixels.shape[-1]]
+
+
+def _pixels_to_image(pixels):
+    """Convert an (H, W, C) array back to a PIL image (mode from its shape
+       and dtype, e.g. RGBA or I;16).
+    """
+    if pixels.shape[2] == 1:
+        pixels = pixels[:, :, 0]
+    return Image.fromarray(pixels)
+
+
+def _check_n_bits(n_bits, pixels):
+    """Make sure n_bits leaves at least the most significant bit untouched.
+    """
+    sample_bits = 8 * pixels.dtype.itemsize
+    if not 1 <= n_bits < sample_bits:
+        raise ValueError("n_bits must be between 1 and " 
+                         + str(sample_bits - 1) + ".")
+
+
+def capacity(image, n_bits=None, color_channels=None, terminator=True):
+    """ Function to calculate how many bytes of secret data fit into an image.
+        Parameters:
+            image - image coming from PIL.Image.Open(), (width, height) or
+                             (width, height, bands); for an image or bands
+                             only its own channels are counted
+            n_bits - how many last bits are used for message encoding:
+                             default = None (every value of BIT_DEPTHS)
+            color_channels - which color channels are used for message
+                             encoding: default = None (every value of 
+                             CHANNEL_SETS)
+            terminator - subtract the "=====" stopping criteria added by
+                             encode(): default = True
+    return number of bytes if n_bits and color_channels are both given, 
+           otherwise a dictionary {(color_channels, n_bits): bytes}
+    """
+    if isinstance(image, tuple):
+        width, height, bands = (image + ("RGBAL",))[:3]
+    else:
+        (width, height), bands = image.size, _image_bands(image)
+    
+    def n_bytes(channels, bits):
+        return max(width * height * _count_channels(channels, bands) * bits 
+                   // 8 
+                   - terminator * len(TERMINATOR), 0)
+    
+    if n_bits is not None and color_channels is not None:
+        return n_bytes(color_channels, n_bits)
+    
+    channel_sets = CHANNEL_SETS if color_channels is None else [color_channels]
+    bit_depths = BIT_DEPTHS if n_bits is None else [n_bits]
+    return {(channels, bits): n_bytes(channels, bits) 
+            for channels in channel_sets for bits in bit_depths}
+
+
+def plan_payload(image, payload_size, channel_sets=CHANNEL_SETS, 
+                 bit_depths=BIT_DEPTHS):
+    """ Function to find the encoding parameters for a payload without 
+        trial encodes. The smallest n_bits is preferred and, for equal n_bits,
+        the smallest number of colour channels.
+        Parameters:
+            image - image coming from PIL.Image.Open(), (width, height) or
+                             (width, height, bands)
+            payload_size - number of bytes (characters) of the secret data
+            channel_sets - colour channel combinations to choose from
+            bit_depths - numbers of bits to choose from
+    return (n_bits, color_channels) tuple or None if the payload does not fit
+    """
+    table = capacity(image)
+    candidates = sorted(
+      ((bits, _count_channels(channels), i, channels) 
+       for i, channels in enumerate(channel_sets) for bits in bit_depths))
+    
+    for bits, _, _, channels in candidates:
+        n_bytes = table.get((channels, bits))
+        if n_bytes is None:
+            n_bytes = capacity(image, bits, channels)
+        if n_bytes >= payload_size:
+            return bits, channels
+    return None
+
+
+def embedded_pixels(image, message_length, n_bits=1, color_channels="RGB"):
+    """ Function to calculate how many pixels encode() changes when no key 
+        is used. The message is written row by row, so only the first
+        pixels of the image (in row-major order) can differ from the 
+        original.
+        Parameters:
+            image - image coming from PIL.Image.Open(), (width, height) or
+                             (width, height, bands)
+            message_length - number of characters of the secret data
+            n_bits - how many last bits are used for message encoding:
+                             default = 1
+            color_channels - which color channels are used for message 
+                             encoding: default = "RGB"
+    return number of leading pixels
+    """
+    if isinstance(image, tuple):
+        width, height, bands = (image + ("RGBAL",))[:3]
+    else:
+        (width, height), bands = image.size, _image_bands(image)
+    n_bytes = (min(capacity(image, n_bits, color_channels), message_length) 
+               + len(TERMINATOR))
+    n_slots = -(-8 * n_bytes // n_bits)
+    return min(-(-n_slots // _count_channels(color_channels, bands)), 
+               width * height)
+
+
+def _channel_indices(color_channels, bands="RGB"):
+    """Convert colour channel letters to array indices in the order of the
+       image channels (bands)
+    """
+    channels = [i for i, band in enumerate(bands) 
+                if band in color_channels.upper()]
+    if not channels:
+        raise ValueError("None of the channels " + color_channels 
+                         + " exists in the image (" + bands + ").")
+    return channels
+
+
+def _round_keys(key, rounds=4):
+    """Derive the Feistel round keys from a user key (string, bytes or int)
+    """
+    if not isinstance(key, bytes):
+        key = str(key).encode("utf-8")
+    digest = hashlib.sha256(key).digest()
+    return [np.uint64(int.from_bytes(digest[8 * i:8 * i + 8], "big")) 
+            for i in range(rounds)]
+
+
+def _keyed_pixel_index(pixel_index, n_pixels, key):
+    """Map raster pixel positions to key-dependent scattered positions.
+    
+       The mapping is a bijection on range(n_pixels): a 4-round Feistel 
+       network on the smallest even power of two >= n_pixels, with cycle 
+       walking for results outside the image. Only the requested positions 
+       are computed, so no permutation array of the full image is needed.
+    """
+    half_bits = max(((int(n_pixels) - 1).bit_length() + 1) // 2, 1)
+    half_shift = np.uint64(half_bits)
+    half_mask = np.uint64((1 << half_bits) - 1)
+    round_keys = _round_keys(key)
+    
+    def feistel(x):
+        left, right = x >> half_shift, x & half_mask
+        for round_key in round_keys:
+            f = ((right ^ round_key) * np.uint64(0x9E3779B97F4A7C15)
+                 >> np.uint64(32)) & half_mask
+            left, right = right, left ^ f
+        return (left << half_shift) | right
+    
+    result = np.empty(pixel_index.shape, dtype=np.uint64)
+    pending = np.arange(pixel_index.size)
+    values = pixel_index.astype(np.uint64).ravel()
+    while pending.size:
+        values = feistel(values)
+        inside = values < np.uint64(n_pixels)
+        result.ravel()[pending[inside]] = values[inside]
+        pending, values = pending[~inside], values[~inside]
+    return result.astype(np.intp)
+
+
+def _slot_positions(channels, first_slot, last_slot, n_pixels, key=None):
+    """Find pixel and channel index of the carrier slots in a range. Slots 
+       are filled pixel by pixel, channel by channel, like the original 
+       implementation did. With a key, pixels are visited in a key-dependent
+       scattered order instead of raster order.
+    """
+    return _slot_index(channels, np.arange(first_slot, last_slot), n_pixels, 
+                       key)
+
+
+def _slot_index(channels, slots, n_pixels, key=None):
+    """Find pixel and channel index of carrier slots given by number (see 
+       _slot_positions())
+    """
+    pixel_index = slots // len(channels)
+    if key is not None:
+        pixel_index = _keyed_pixel_index(pixel_index, n_pixels, key)
+    return pixel_index, np.asarray(channels)[slots % len(channels)]
+
+
+def _batch_view(pixels):
+    """View an (H, W, C) image or a (B, H, W, C) batch as (B, H * W, C).
+    """
+    return pixels.reshape(-1, pixels.shape[-3] * pixels.shape[-2], 
+                          pixels.shape[-1])
+
+
+def _match(values, replaced, n_bits, rng):
+    """ Function for LSB matching: instead of overwriting the low n_bits,
+        every value moves to the nearest value with the new low bits, which
+        is the replaced value or the one 2^n_bits beyond it on the other 
+        side of the original value (for n_bits = 1 a random +1 or -1 if the
+        bit differs). Ties are broken by rng, values outside the sample range
+        are not used.
+    return array of new values
+    """
+    step = 1 << n_bits
+    candidate = replaced.astype(np.int16 if values.dtype.itemsize == 1 
+                                else np.int32)
+    difference = candidate - values
+    half = step // 2
+    
+    # One random bit per value, drawn as bytes.
+    coin = np.unpackbits(rng.integers(0, 256, -(-values.size // 8), 
+                                      dtype=np.uint8), 
+                         count=values.size).reshape(values.shape).view(bool)
+    
+    # The replaced value is more than step / 2 above (below) the original:
+    #
+    # the alternative step below (above) it is nearer (exactly step / 2: 
+    # either one).
+    lower = (difference > half) | ((difference == half) & coin)
+    lower &= candidate >= step
+    higher = (difference < -half) | ((difference == -half) & coin)
+    higher &= candidate <= np.iinfo(values.dtype).max - step
+    step = candidate.dtype.type(step)
+    candidate -= lower.view(np.uint8) * step
+    candidate += higher.view(np.uint8) * step
+    return candidate.astype(values.dtype)
+
+
+def _write_bits(pixels, bits, bit_offset, n_bits, channels, key=None, 
+                lengths=None, rng=None):
+    """Write a bit array (values 0/1) into the low n_bits of the carrier 
+       slots, starting at bit_offset of the carrier bit stream. pixels is 
+       modified in place. For a (B, H, W, C) batch, bits has shape (B, L) and
+       lengths gives how many bits of each row are written (default: all).
+       With a NumPy random generator rng, values are changed by LSB matching
+       (see _match()) instead of replacing their low bits. Raises 
+       ValueError if the bits run past the last slot.
+    """
+    flat = _batch_view(pixels)
+    bits = np.atleast_2d(bits)
+    first_slot = bit_offset // n_bits
+    last_slot = -(-(bit_offset + bits.shape[1]) // n_bits)
+    if last_slot > flat.shape[1] * len(channels):
+        # E.g. not even the stopping criteria fits into a tiny image.
+        raise ValueError("Data does not fit into the image.")
+    pixel_index, channel_index = _slot_positions(channels, first_slot, 
+                                                 last_slot, flat.shape[1], key)
+    values = np.ascontiguousarray(flat[:, pixel_index, channel_index])
+    
+    # Unpack the low bits of every slot, so slots which are only partially
+    #
+    # overwritten keep their remaining bits.
+    shifts = np.arange(n_bits - 1, -1, -1, dtype=values.dtype)
+    slot_bits = (values[:, :, np.newaxis] >> shifts) & 1
+    lead = bit_offset - first_slot * n_bits
+    target = slot_bits.reshape(len(flat), -1)[:, lead:lead + bits.shape[1]]
+    if lengths is None:
+        target[...] = bits
+    else:
+        np.copyto(target, bits, casting="unsafe", where=(
+          np.arange(bits.shape[1]) < np.asarray(lengths)[:, np.newaxis]))
+    
+    low_bits = (slot_bits << shifts).sum(axis=2, dtype=values.dtype)
+    keep_mask = values.dtype.type(np.iinfo(values.dtype).max 
+                                  ^ ((1 << n_bits) - 1))
+    replaced = (values & keep_mask) | low_bits
+    if rng is not None:
+        replaced = _match(values, replaced, n_bits, rng)
+    flat[:, pixel_index, channel_index] = replaced
+
+
+def _read_bits(pixels, bit_offset, n_read, n_bits, channels, key=None):
+    """Read n_read bits of the carrier bit stream starting at bit_offset
+    
+        return uint8 array of 0/1 values (shape (B, n_read) for a batch)
+    """
+    flat = _batch_view(pixels)
+    first_slot = bit_offset // n_bits
+    last_slot = -(-(bit_offset + n_read) // n_bits)
+    pixel_index, channel_index = _slot_positions(channels, first_slot, 
+                                                 last_slot, flat.shape[1], key)
+    values = np.ascontiguousarray(flat[:, pixel_index, channel_index])
+    shifts = np.arange(n_bits - 1, -1, -1, dtype=values.dtype)
+    slot_bits = ((values[:, :, np.newaxis] >> shifts) & 1).astype(np.uint8)
+    lead = bit_offset - first_slot * n_bits
+    bits = slot_bits.reshape(len(flat), -1)[:, lead:lead + n_read]
+    return bits if pixels.ndim == 4 else bits[0]
+
+
+def embed_bytes(original_image, data, n_bits=1, color_channels="RGB", 
+                byte_offset=0, key=None):
+    """ Function to embed binary data into an image. Unlike encode(), no 
+        stopping criteria is added, so the reader has to know the length.
+        Parameters:
+            original_image - Image that will be used for data encoding. 
+                             Coming from PIL.Image.Open()
+            data - bytes to be embedded
+            n_bits - how many last bits to be used for data encoding: 
+                             default = 1
+            color_channels - which color channels to be used for data 
+                             encoding: default = "RGB"
+            byte_offset - position in the carrier bit stream (in bytes) 
+                             where data starts: default = 0
+            key - if given, pixels are used in a key-dependent scattered 
+                             order instead of row by row: default = None
+    return encoded image
+    """
+    n_bytes = capacity(original_image, n_bits, color_channels, 
+                       terminator=False)
+    if byte_offset + len(data) > n_bytes:
+        raise ValueError("Data does not fit into the image.")
+    
+    pixels, bands = _carrier_pixels(original_image)
+    _check_n_bits(n_bits, pixels)
+    bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+    _write_bits(pixels, bits, 8 * byte_offset, n_bits, 
+                _channel_indices(color_channels, bands), key)
+    return _pixels_to_image(pixels)
+
+
+def extract_bytes(image, n_bytes, n_bits=1, color_channels="RGB", 
+                  byte_offset=0, key=None):
+    """ Function to read binary data embedded with embed_bytes().
+        Parameters:
+            image - image coming from PIL.Image.Open()
+            n_bytes - number of bytes to read
+            n_bits - how many last bits were used for data encoding: 
+                             default = 1
+            color_channels - which color channels were used for data 
+                             encoding: default = "RGB"
+            byte_offset - position in the carrier bit stream (in bytes) 
+                             where data starts: default = 0
+            key - key used for encoding: default = None
+    return bytes
+    """
+    if byte_offset + n_bytes > capacity(image, n_bits, color_channels, 
+                                        terminator=False):
+        raise ValueError("Requested data exceeds the image capacity.")
+    
+    pixels, bands = _carrier_pixels(image)
+    _check_n_bits(n_bits, pixels)
+    bits = _read_bits(pixels, 8 * byte_offset, 8 * n_bytes, n_bits, 
+                      _channel_indices(color_channels, bands), key)
+    return np.packbits(bits).tobytes()
+
+
+def _check_embedding(embedding):
+    """Make sure the embedding is one of EMBEDDINGS.
+    """
+    if embedding not in EMBEDDINGS:
+        raise ValueError("Unknown embedding " + str(embedding) 
+                         + ", choose from " + ", ".join(EMBEDDINGS) + ".")
+
+
+def _message_capacity(image, n_bits, color_channels, ecc=False, 
+                      embedding="replace"):
+    """Calculate how many message characters encode() can hide (the 
+       stopping criteria, the error-correcting code and the byte storing 
+       the matrix embedding parameter are subtracted)
+    """
+    n_bytes = capacity(image, n_bits, color_channels, terminator=False)
+    if embedding == "matrix":
+        n_bytes -= 1
+    if ecc:
+        n_bytes = (n_bytes // stegano_ecc.CODE_BLOCK_BYTES 
+                   * stegano_ecc.BLOCK_BYTES)
+    return max(n_bytes - len(TERMINATOR), 0)
+
+
+def _write_bytes(pixels, data, byte_offset, n_bits, channels, key, limit):
+    """Write bytes at byte_offset of the carrier bit stream (at most up to
+       byte limit)
+
+        return byte offset after the written data
+    """
+    if byte_offset + len(data) > limit:
+        raise ValueError("Data does not fit into the image.")
+    if data:
+        bits = np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+        _write_bits(pixels, bits, 8 * byte_offset, n_bits, channels, key)
+    return byte_offset + len(data)
+
+
+def embed_stream(original_image, chunks, n_bits=1, color_channels="RGB", 
+                 byte_offset=0, key=None, header=None):
+    """ Function to embed binary data arriving in chunks (e.g. from a 
+        compressor) without joining it first. Chunks are collected up to 
+        DECODE_CHUNK_BYTES and written into one pixel array.
+        Parameters:
+            original_image - Image that will be used for data encoding. 
+                             Coming from PIL.Image.Open()
+            chunks - iterable of bytes
+            n_bits - how many last bits to be used for data encoding: 
+                             default = 1
+            color_channels - which color channels to be used for data 
+                             encoding: default = "RGB"
+            byte_offset - position in the carrier bit stream (in bytes) 
+                             where the data starts: default = 0
+            key - if given, pixels are used in a key-dependent scattered 
+                             order instead of row by row: default = None
+            header - function called with the number of embedded bytes, 
+                             returning at most byte_offset bytes written at
+                             the start of the carrier: default = None
+    return encoded image
+    """
+    pixels, bands = _carrier_pixels(original_image)
+    _check_n_bits(n_bits, pixels)
+    channels = _channel_indices(color_channels, bands)
+    limit = capacity(original_image, n_bits, color_channels, terminator=False)
+    
+    position = byte_offset
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= DECODE_CHUNK_BYTES:
+            position = _write_bytes(pixels, buffer, position, n_bits, 
+                                    channels, key, limit)
+            buffer.clear()
+    position = _write_bytes(pixels, buffer, position, n_bits, channels, key, 
+                            limit)
+    
+    if header is not None:
+        _write_bytes(pixels, header(position - byte_offset), 0, n_bits, 
+                     channels, key, byte_offset)
+    
+    profiling.count("bytes_embedded", position)
+    return _pixels_to_image(pixels)
+
+
+def carrier_reader(image, n_bits=1, color_channels="RGB", byte_offset=0, 
+                   key=None):
+    """ Function to read binary data piece by piece, e.g. a header followed
+        by chunks of the data it describes. The image is converted once.
+        Parameters:
+            image - image coming from PIL.Image.Open()
+            n_bits - how many last bits were used for data encoding: 
+                             default = 1
+            color_channels - which color channels were used for data 
+                             encoding: default = "RGB"
+            byte_offset - position in the carrier bit stream (in bytes) of 
+                             the first read: default = 0
+            key - key used for encoding: default = None
+    return function read(n_bytes) returning the next n_bytes bytes
+    """
+    pixels, bands = _carrier_pixels(image)
+    _check_n_bits(n_bits, pixels)
+    channels = _channel_indices(color_channels, bands)
+    limit = capacity(image, n_bits, color_channels, terminator=False)
+    position = byte_offset
+    
+    def read(n_bytes):
+        nonlocal position
+        if position + n_bytes > limit:
+            raise ValueError("Requested data exceeds the image capacity.")
+        bits = _read_bits(pixels, 8 * position, 8 * n_bytes, n_bits, 
+                          channels, key)
+        position += n_bytes
+        return np.packbits(bits).tobytes()
+    
+    return read
+
+
+def _syndrome_bits(cover_bits, k):
+    """Hamming syndrome of every group of 2^k - 1 carrier bits as k bits 
+       (most significant first): the XOR of the (1-based) positions of its
+       set bits, computed as parities with one matrix product.
+    """
+    positions = np.arange(1, 2**k)[:, np.newaxis]
+    parity_checks = (positions >> np.arange(k - 1, -1, -1)) & 1
+    counts = cover_bits.astype(np.float32) @ parity_checks.astype(np.float32)
+    return (counts.astype(np.intp) & 1).astype(np.uint8)
+
+
+def _matrix_embed(pixels, bits, n_bits, channels, key=None):
+    """ Function to hide a bit array with matrix embedding (F5 style): every
+        group of n = 2^k - 1 carrier bits holds k message bits as its 
+        Hamming syndrome, so at most one carrier bit per group changes. The
+        largest k which fits the message is used and stored in the first 
+        carrier byte. pixels is modified in place. Raises ValueError if 
+        not even k = 1 fits.
+    """
+    n_cover = _batch_view(pixels).shape[1] * len(channels) * n_bits - 8
+    k = max((k for k in range(1, MATRIX_MAX_BITS + 1) 
+             if -(-bits.size // k) * (2**k - 1) <= n_cover), default=None)
+    if k is None:
+        raise ValueError("Data does not fit into the image.")
+    _write_bits(pixels, np.unpackbits(np.array([k], dtype=np.uint8)), 0, 
+                n_bits, channels, key)
+    
+    # k message bits per group (the last group padded).
+    n = 2**k - 1
+    n_groups = -(-bits.size // k)
+    message = np.zeros(n_groups * k, dtype=np.uint8)
+    message[:bits.size] = bits
+    cover = _read_bits(pixels, 8, n_groups * n, n_bits, channels, 
+                       key).reshape(n_groups, n)
+    
+    # Flipping the bit at position syndrome ^ message makes both equal.
+    shifts = np.arange(k - 1, -1, -1)
+    flips = ((_syndrome_bits(cover, k) ^ message.reshape(n_groups, k)) 
+             << shifts).sum(axis=1)
+    changed = np.flatnonzero(flips)
+    
+    # Only the changed bits are written (a slot can hold several of them).
+    flat = pixels.reshape(-1, pixels.shape[-1])
+    bit_index = 8 + changed * n + flips[changed] - 1
+    pixel_index, channel_index = _slot_index(channels, bit_index // n_bits, 
+                                             flat.shape[0], key)
+    masks = (1 << (n_bits - 1 - bit_index % n_bits)).astype(flat.dtype)
+    np.bitwise_xor.at(flat, (pixel_index, channel_index), masks)
+    profiling.count("bits_changed", changed.size)
+
+
+def _matrix_extract(pixels, n_bits, channels, key=None):
+    """ Function to read the bytes hidden with _matrix_embed() chunk by 
+        chunk (multiples of 8 bytes except the last one).
+    return generator of bytes
+    """
+    k = int(np.packbits(_read_bits(pixels, 0, 8, n_bits, channels, key))[0])
+    if not 1 <= k <= MATRIX_MAX_BITS:
+        raise ValueError("No matrix embedded message found.")
+    n = 2**k - 1
+    n_groups = (_batch_view(pixels).shape[1] * len(channels) * n_bits - 8) // n
+    
+    # Whole bytes per chunk: a multiple of 64 groups gives 8 * k bytes.
+    chunk_groups = 64 * max(DECODE_CHUNK_BYTES // (8 * k), 1)
+    for first_group in range(0, n_groups, chunk_groups):
+        groups = min(chunk_groups, n_groups - first_group)
+        cover = _read_bits(pixels, 8 + first_group * n, groups * n, n_bits, 
+                           channels, key).reshape(groups, n)
+        yield np.packbits(_syndrome_bits(cover, k)).tobytes()
+
+
+def encode(original_image, secret_data, n_bits = 1, color_channels="RGB",
+           key=None, ecc=False, embedding="replace", seed=None):
     """ Function to encode a message string into an image.
         Parameters:
             original_image - Image that will be used for data encoding. 
@@ -34,108 +679,423 @@ def encode(original_image, secret_data, n_bits = 1, color_channels="RGB"):
                              default = 1
             color_channels - which color channels to be used for message 
                              encoding (options: "R", "G", "B", "RG","RB", "GB",
-                            "RGB"): default = "RGB"
-    return encoded image
+                            "RGB", plus "A" for alpha and "L" for grayscale
+                            images): default = "RGB"
+            key - if given, pixels are used in a key-dependent scattered 
+                             order instead of row by row: default = None
+            ecc - add the error-correcting code of stegano_ecc, which 
+                             corrects single flipped bits but halves the
+                             capacity: default = False
+            embedding - "replace" overwrites the last n_bits, "matrix" 
+                             changes fewer of them for messages below the
+                             capacity (see _matrix_embed()), "matching" 
+                             changes values by LSB matching (see _match()):
+                             default = "replace"
+            seed - seed of the random generator of "matching": 
+                             default = None (unpredictable)
+    return encoded image (same mode as original_image for RGB, RGBA, 
+           grayscale and 16-bit grayscale, otherwise RGB/RGBA)
     """
+    _check_embedding(embedding)
     
-    # Use PIL Library to be compatible with wxPython bitmap.
-    image = original_image.convert('RGB')
-    pix = image.load()
+    # Keep alpha and 16-bit samples instead of converting to 8-bit RGB.
+    image = original_image
+    pixels, bands = _carrier_pixels(image)
+    _check_n_bits(n_bits, pixels)
+    channels = _channel_indices(color_channels, bands)
     
-    # Calculate maximum bytes to encode (subtract by 5 at end 
+    # Calculate maximum bytes to encode (the ending "=====" is already 
     #
-    # due to ending "=====".
-    n_bytes = (image.width * image.height * len(color_channels) 
-               * n_bits // 8 - 5)     
-    print("[*] Maximum bytes to encode:", n_bytes)
+    # subtracted).
+    n_bytes = _message_capacity(image, n_bits, color_channels, ecc, 
+                                embedding)
+    logger.debug("[*] Maximum bytes to encode: %d", n_bytes)
     
-    # Crop  message so full picture is overlayed with secret message.
-    secret_data = secret_data[0:n_bits * n_bytes]       
+    # Crop message so full picture is overlayed with secret message.
+    secret_data = secret_data[0:n_bytes]       
     
-    print("[*] Encoding data...")
+    logger.debug("[*] Encoding data...")
     
     # Add stopping criteria to tell if content of file has ended.
-    secret_data += "====="  
+    secret_data += TERMINATOR  
+    
+    # Convert data to binary format (one byte per character).
+    data = secret_data.encode("latin-1", "replace")
+    if ecc:
+        data = stegano_ecc.encode(data)
+    binary_secret_data = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
     
-    data_index = 0
+    # Overwrite the last n_bits of the chosen channels, pixel by pixel (in 
+    #
+    # scattered order if a key is given).
+    if embedding == "matrix":
+        _matrix_embed(pixels, binary_secret_data, n_bits, channels, key)
+    else:
+        rng = np.random.default_rng(seed) if embedding == "matching" else None
+        _write_bits(pixels, binary_secret_data, 0, n_bits, channels, key, 
+                    rng=rng)
+    
+    profiling.count("pixels_processed", image.width * image.height)
+    profiling.count("bytes_embedded", len(secret_data))
+    return _pixels_to_image(pixels)
+
+
+def encode_depths(original_image, secret_data, bit_depths=BIT_DEPTHS, 
+                  color_channels="RGB", key=None):
+    """ Function to encode a message string with several bit depths at once.
+        The result for each depth equals encode(), but the payload is 
+        converted to bits once and the slot positions and original values 
+        are computed once for the deepest use and shared by all depths.
+        Parameters:
+            original_image - Image that will be used for data encoding. 
+                             Coming from PIL.Image.Open()
+            secret_data - string to be encoded into the picture
+            bit_depths - numbers of last bits to be used for message 
+                             encoding: default = BIT_DEPTHS
+            color_channels - which color channels to be used for message 
+                             encoding: default = "RGB"
+            key - if given, pixels are used in a key-dependent scattered 
+                             order instead of row by row: default = None
+    return dictionary {n_bits: encoded image}
+    """
+    image = original_image
+    pixels, bands = _carrier_pixels(image)
+    for n_bits in bit_depths:
+        _check_n_bits(n_bits, pixels)
+    flat = pixels.reshape(-1, pixels.shape[-1])
     
-    # Convert data to binary format.
-    binary_secret_data = to_bin(secret_data) 
+    # Message and slot count of every depth (the message is cropped to the
+    #
+    # capacity, the stopping criteria is always added).
+    n_message_bytes = {n_bits: min(capacity(image, n_bits, color_channels), 
+                                   len(secret_data)) 
+                       for n_bits in bit_depths}
+    n_slots = {n_bits: -(-8 * (n_message_bytes[n_bits] + len(TERMINATOR)) 
+                         // n_bits) 
+               for n_bits in bit_depths}
     
-    # Calculate size of data to hide.
-    data_len = len(binary_secret_data)
+    # Shared intermediates: the longest message as bits, the stopping 
+    #
+    # criteria as bits and the slot positions/values of the deepest use.
+    message_bits = np.unpackbits(np.frombuffer(
+      secret_data[0:max(n_message_bytes.values())].encode("latin-1", 
+                                                           "replace"), 
+      dtype=np.uint8))
+    terminator_bits = np.unpackbits(np.frombuffer(
+      TERMINATOR.encode("latin-1"), dtype=np.uint8))
+    pixel_index, channel_index = _slot_positions(
+      _channel_indices(color_channels, bands), 0, max(n_slots.values()), 
+      flat.shape[0], key)
+    values = flat[pixel_index, channel_index]
     
-    # Collect RGB values of each pixel and convert to binary format.
-    for col in range(image.height):
-        for row in range(image.width):
-            pixel = np.asarray(pix[row,col])
-            r, g, b = to_bin(pixel) 
+    encoded_images = {}
+    for n_bits in bit_depths:
+        slots = n_slots[n_bits]
+        n_message_bits = 8 * n_message_bytes[n_bits]
+        n_data_bits = n_message_bits + terminator_bits.size
+        shifts = np.arange(n_bits - 1, -1, -1, dtype=values.dtype)
+        
+        # Bit-group view: n_bits per slot, the last slot keeps the original
+        #
+        # bits it is not fully overwritten with.
+        bits = np.empty(slots * n_bits, dtype=values.dtype)
+        bits[:n_message_bits] = message_bits[:n_message_bits]
+        bits[n_message_bits:n_data_bits] = terminator_bits
+        bits[n_data_bits:] = ((values[slots - 1] >> shifts) 
+                              & 1)[n_data_bits - (slots - 1) * n_bits:]
+        low_bits = (bits.reshape(slots, n_bits) << shifts).sum(
+          axis=1, dtype=values.dtype)
+        keep_mask = values.dtype.type(np.iinfo(values.dtype).max 
+                                      ^ ((1 << n_bits) - 1))
+        
+        encoded = pixels.copy()
+        encoded.reshape(flat.shape)[pixel_index[:slots], 
+                                    channel_index[:slots]] = (
+          (values[:slots] & keep_mask) | low_bits)
+        encoded_images[n_bits] = _pixels_to_image(encoded)
         
-            if data_index < data_len and ("R" in color_channels.upper() ):
-                # least significant red pixel bit
-                temp_value_1 = (
-                    r[:-n_bits] 
-                    + binary_secret_data[data_index:data_index + n_bits])
-                pixel[0] = int(temp_value_1, 2)
-                data_index += n_bits
-            
-            if data_index < data_len and ("G" in color_channels.upper() ):
-                # least significant green pixel bit
-                temp_value_2 = (
-                    g[:-n_bits] 
-                    + binary_secret_data[data_index:data_index+n_bits])
-                pixel[1] = int(temp_value_2, 2)
-                data_index += n_bits
-            
-            if data_index < data_len and ("B" in color_channels.upper() ):
-                # least significant blue pixel bit
-                temp_value_3 = (
-                    b[:-n_bits] 
-                    + binary_secret_data[data_index:data_index+n_bits])
-                pixel[2] = int(temp_value_3, 2)
-                data_index += n_bits
-                
-            pix[row,col] = (pixel[0],pixel[1],pixel[2])
-            
-            # If data is encoded, break out of the loop.
-            if data_index >= data_len:
-                break
-    return image
-
-
-def decode(image_filepath, n_bits = 1, color_channels="RGB"):
+        profiling.count("pixels_processed", image.width * image.height)
+        profiling.count("bytes_embedded", n_data_bits // 8)
+    return encoded_images
+
+
+def decode(image_filepath, n_bits = 1, color_channels="RGB", key=None, 
+           ecc=False, embedding="replace"):
     """ Function to decode a message string from an image.
         Parameters:
-            image_filepath - file path of the image
+            image_filepath - file path of the image (or image coming from
+                             PIL.Image.Open())
             n_bits - how many last bits to be used for message encoding: 
                              default = 1
             color_channels - which color channels to be used for message 
                              encoding (options: "R", "G", "B", "RG","RB", "GB",
                             "RGB"): default = "RGB"
+            key - key used for encoding: default = None
+            ecc - the message was encoded with the error-correcting code:
+                             default = False
+            embedding - embedding used for encoding (see encode(), 
+                             "matching" is read like "replace"): 
+                             default = "replace"
     return secret message
     """
-    print("[+] Decoding ...")
-    im = PIL.Image.open(image_filepath)
-    pix = im.load()
-    binary_data = ""
-    for row in range(im.height):
-        for col in range(im.width):
-            pixel = np.asarray(pix[col,row])
-            r, g, b = to_bin(pixel)
-            if ("R" in color_channels.upper() ):
-                binary_data += r[8-n_bits:8]
-            if ("G" in color_channels.upper() ):
-                binary_data += g[8-n_bits:8]
-            if ("B" in color_channels.upper() ):
-                binary_data += b[8-n_bits:8]
-                
-    # Split binary data by 8-bits.
-    all_bytes = [binary_data[i: i+8] for i in range(0, len(binary_data), 8)]
-    decoded_data = ""
-    
-    # Convert byte information to readable data.
-    for byte in all_bytes:
-        decoded_data += chr(int(byte, 2))
-        if decoded_data[-5:] == "=====":
-            break
-    return decoded_data[:-5]
\ No newline at end of file
+    _check_embedding(embedding)
+    logger.debug("[+] Decoding ...")
+    im = image_filepath
+    if not isinstance(im, Image.Image):
+        im = Image.open(image_filepath)
+    pixels, bands = _carrier_pixels(im)
+    _check_n_bits(n_bits, pixels)
+    channels = _channel_indices(color_channels, bands)
+    terminator = TERMINATOR.encode("latin-1")
+    
+    if embedding == "matrix":
+        chunks = _matrix_extract(pixels, n_bits, channels, key)
+    else:
+        n_bytes = capacity(im, n_bits, color_channels, terminator=False)
+        chunks = (np.packbits(_read_bits(
+                    pixels, 8 * byte_offset, 
+                    8 * min(DECODE_CHUNK_BYTES, n_bytes - byte_offset), 
+                    n_bits, channels, key)).tobytes()
+                  for byte_offset in range(0, n_bytes, DECODE_CHUNK_BYTES))
+    decoded_data = bytearray()
+    
+    # Read the carrier chunk by chunk (whole code blocks except for the 
+    #
+    # last chunk) and stop at the stopping criteria.
+    for data in chunks:
+        search_start = max(len(decoded_data) - len(terminator) + 1, 0)
+        if ecc:
+            data = stegano_ecc.decode(
+              data[:len(data) - len(data) % stegano_ecc.CODE_BLOCK_BYTES])
+        decoded_data += data
+        end = decoded_data.find(terminator, search_start)
+        if end >= 0:
+            return decoded_data[:end].decode("latin-1")
+    return decoded_data[:-len(terminator)].decode("latin-1")
+
+
+def _probe_candidates(pixels, bands, channel_sets, bit_depths):
+    """List the (n_bits, channel count, color_channels, channel indices) 
+       settings to probe without settings reading the same channels. The 
+       most bits per pixel come first: a setting reading only some of the 
+       slots of the real one can look like text as well, while one reading 
+       more slots also reads unchanged image bits, so ties go to the first.
+    """
+    if channel_sets is None:
+        channel_sets = ["".join(combination) 
+                        for n in range(1, len(bands) + 1)
+                        for combination in itertools.combinations(bands, n)]
+    if bit_depths is None:
+        bit_depths = range(1, 8 * pixels.dtype.itemsize)
+    
+    candidates = {}
+    for channels in channel_sets:
+        if not any(band in channels.upper() for band in bands):
+            continue
+        indices = tuple(_channel_indices(channels, bands))
+        for n_bits in bit_depths:
+            _check_n_bits(n_bits, pixels)
+            candidates.setdefault((n_bits, indices), channels)
+    return sorted(((n_bits, len(indices), channels, indices) 
+                   for (n_bits, indices), channels in candidates.items()),
+                  key=lambda c: (-c[0] * c[1], c[0]))
+
+
+def _probe_scores(data, lengths):
+    """ Function to score probed bytes as the start of a message: the mean
+        TEXT_LOG_ODDS of the bytes before the stopping criteria, reduced by 
+        the share of bytes repeating with a period up to MAX_PROBE_PERIOD 
+        (flat image regions give repeating, text-like bytes), plus 
+        TERMINATOR_SCORE if the stopping criteria is found.
+        Parameters:
+            data - (N, PROBE_BYTES) uint8 array, one row per candidate
+            lengths - number of valid bytes of every row
+    return array of N scores
+    """
+    terminator = np.frombuffer(TERMINATOR.encode("latin-1"), dtype=np.uint8)
+    positions = np.arange(data.shape[1])
+    
+    # First occurrence of the stopping criteria (or the row length).
+    windows = np.lib.stride_tricks.sliding_window_view(
+      data, len(terminator), axis=1)
+    found = ((windows == terminator).all(axis=2) 
+             & (positions[:windows.shape[1]] + len(terminator) 
+                <= lengths[:, np.newaxis]))
+    has_end = found.any(axis=1)
+    ends = np.where(has_end, found.argmax(axis=1), lengths)
+    
+    body = positions < ends[:, np.newaxis]
+    text = np.where(body, TEXT_LOG_ODDS[data], 0).sum(axis=1)
+    
+    repeated = np.zeros(len(data))
+    for period in range(1, MAX_PROBE_PERIOD + 1):
+        same = ((data[:, period:] == data[:, :-period]) 
+                & body[:, period:]).sum(axis=1)
+        repeated = np.maximum(repeated, 
+                              same / np.maximum(ends - period, 1))
+    
+    n_body = np.maximum(ends, 1)
+    return (np.where(ends > 0, text / n_body * (1 - repeated), 0) 
+            + TERMINATOR_SCORE * has_end)
+
+
+def detect_parameters(image, channel_sets=None, bit_depths=None, key=None, 
+                      probe_bytes=PROBE_BYTES):
+    """ Function to find n_bits and color_channels of an encoded image. The
+        first probe_bytes of every candidate setting are read with a single
+        gather from the pixel array and scored (see _probe_scores()).
+        Parameters:
+            image - image coming from PIL.Image.Open()
+            channel_sets - colour channel combinations to try: default = 
+                             None (every combination of the image channels)
+            bit_depths - numbers of bits to try: default = None (every 
+                             depth leaving the most significant bit)
+            key - key used for encoding: default = None
+            probe_bytes - number of bytes read per setting: 
+                             default = PROBE_BYTES
+    return (n_bits, color_channels) tuple of the best setting or None if no
+           setting reaches MIN_PROBE_SCORE
+    """
+    pixels, bands = _carrier_pixels(image)
+    candidates = _probe_candidates(pixels, bands, channel_sets, bit_depths)
+    if not candidates:
+        return None
+    flat = pixels.reshape(-1, pixels.shape[-1])
+    n_pixels = flat.shape[0]
+    
+    # Bit t of every candidate stream: slot t // n_bits, bit n_bits - 1 - 
+    #
+    # t % n_bits of the slot, slots filled pixel by pixel, channel by channel.
+    n_bits = np.array([bits for bits, _, _, _ in candidates])[:, np.newaxis]
+    n_channels = np.array([count for _, count, _, _ in candidates])
+    channel_table = np.zeros((len(candidates), len(bands)), dtype=np.intp)
+    for row, (_, count, _, indices) in enumerate(candidates):
+        channel_table[row, :count] = indices
+    
+    t = np.arange(8 * probe_bytes)
+    slots = t // n_bits
+    pixel_index = slots // n_channels[:, np.newaxis]
+    channel_index = np.take_along_axis(
+      channel_table, slots % n_channels[:, np.newaxis], axis=1)
+    
+    # Probes of small images stop at the capacity.
+    lengths = np.minimum(n_pixels * n_channels * n_bits[:, 0] // 8, 
+                         probe_bytes)
+    pixel_index = np.minimum(pixel_index, n_pixels - 1)
+    if key is not None:
+        pixel_index = _keyed_pixel_index(pixel_index, n_pixels, key)
+    
+    values = flat[pixel_index, channel_index]
+    shifts = (n_bits - 1 - t % n_bits).astype(values.dtype)
+    data = np.packbits(((values >> shifts) & 1).astype(np.uint8), axis=1)
+    
+    scores = _probe_scores(data, lengths)
+    best = int(np.argmax(scores))
+    logger.debug("[+] Best probe score: %.3f", scores[best])
+    if scores[best] < MIN_PROBE_SCORE:
+        return None
+    return candidates[best][0], candidates[best][2]
+
+
+def decode_auto(image_filepath, channel_sets=None, bit_depths=None, 
+                key=None):
+    """ Function to decode a message string without knowing n_bits and 
+        color_channels (see detect_parameters()).
+        Parameters:
+            image_filepath - file path of the image (or image coming from
+                             PIL.Image.Open())
+            channel_sets - colour channel combinations to try: default = 
+                             None (every combination of the image channels)
+            bit_depths - numbers of bits to try: default = None (every 
+                             depth leaving the most significant bit)
+            key - key used for encoding: default = None
+    return (secret message, n_bits, color_channels) or None if no setting 
+           looks like a message
+    """
+    im = image_filepath
+    if not isinstance(im, Image.Image):
+        im = Image.open(image_filepath)
+    setting = detect_parameters(im, channel_sets, bit_depths, key)
+    if setting is None:
+        return None
+    n_bits, color_channels = setting
+    return decode(im, n_bits, color_channels, key), n_bits, color_channels
+
+
+
+def encode_batch(images, secret_data, n_bits=1, color_channels="RGB", 
+                 key=None):
+    """ Function to encode messages into a batch of same-size images with
+        one set of array operations (e.g. many thumbnails).
+        Parameters:
+            images - (B, H, W, C) array or list of (H, W, C) arrays, uint8 
+                             or uint16 with C = 1 (L), 2 (LA), 3 (RGB) or 
+                             4 (RGBA)
+            secret_data - one string per image, or one string for all
+            n_bits - how many last bits to be used for message encoding: 
+                             default = 1
+            color_channels - which color channels to be used for message 
+                             encoding: default = "RGB"
+            key - if given, pixels are used in a key-dependent scattered 
+                             order instead of row by row: default = None
+    return (B, H, W, C) array of encoded images
+    """
+    pixels = np.array(np.stack(images) if isinstance(images, list) 
+                      else images)
+    _check_n_bits(n_bits, pixels)
+    if isinstance(secret_data, str):
+        secret_data = [secret_data] * len(pixels)
+    if len(secret_data) != len(pixels):
+        raise ValueError("Number of messages and images differ.")
+    
+    n_bytes = capacity((pixels.shape[2], pixels.shape[1], 
+                        _array_bands(pixels)), n_bits, color_channels)
+    messages = [(data[0:n_bytes] + TERMINATOR).encode("latin-1", "replace") 
+                for data in secret_data]
+    
+    # Pad the messages to one (B, max length) byte array.
+    lengths = np.array([len(message) for message in messages])
+    padded = np.zeros((len(messages), lengths.max()), dtype=np.uint8)
+    for i, message in enumerate(messages):
+        padded[i, :len(message)] = np.frombuffer(message, dtype=np.uint8)
+    
+    _write_bits(pixels, np.unpackbits(padded, axis=1), 0, n_bits, 
+                _channel_indices(color_channels, _array_bands(pixels)), key, 
+                lengths=8 * lengths)
+    
+    profiling.count("pixels_processed", pixels.shape[0] * pixels.shape[1] 
+                    * pixels.shape[2])
+    profiling.count("bytes_embedded", int(lengths.sum()))
+    return pixels
+
+
+def decode_batch(images, n_bits=1, color_channels="RGB", key=None):
+    """ Function to decode messages from a batch of same-size images.
+        Parameters:
+            images - (B, H, W, C) array or list of (H, W, C) arrays (see
+                             encode_batch())
+            n_bits - how many last bits were used for message encoding: 
+                             default = 1
+            color_channels - which color channels were used for message 
+                             encoding: default = "RGB"
+            key - key used for encoding: default = None
+    return list of secret messages
+    """
+    pixels = np.asarray(np.stack(images) if isinstance(images, list) 
+                        else images)
+    n_bytes = capacity((pixels.shape[2], pixels.shape[1], 
+                        _array_bands(pixels)), n_bits, color_channels, 
+                       terminator=False)
+    _check_n_bits(n_bits, pixels)
+    bits = _read_bits(pixels, 0, 8 * n_bytes, n_bits, 
+                      _channel_indices(color_channels, _array_bands(pixels)), 
+                      key)
+    terminator = TERMINATOR.encode("latin-1")
+    
+    messages = []
+    for row in np.packbits(bits, axis=1):
+        data = row.tobytes()
+        end = data.find(terminator)
+        messages.append(data[:end if end >= 0 else -len(terminator)]
+                        .decode("latin-1"))
+    return messages
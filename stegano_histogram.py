@@ -0,0 +1,128 @@
+"""Histogram based measures of images and their encodings.
+
+Every channel of an image (or of a batch of images) is counted in a single
+np.bincount pass; entropy, histogram difference and the chi-square attack
+are all calculated from these histograms. LSB encoding only changes the
+pixels holding the message, so the histograms of an encoded image can be
+derived from the original ones by recounting only that region (see
+update_histograms()).
+"""
+import numpy as np
+from scipy.stats import chi2
+
+# Number of histogram bins (possible values of an 8-bit sample).
+LEVELS = 256
+
+
+def _channel_offsets(n_histograms, levels):
+    """Bin offset of every (image, channel) histogram in the shared bincount
+    """
+    return levels * np.arange(n_histograms, dtype=np.intp)
+
+
+def channel_histograms(images, levels=LEVELS):
+    """ Function to count the values of every channel in one bincount pass.
+        Parameters:
+            images - (H, W), (H, W, C) or (B, H, W, C) array of integers
+                     (or a PIL image)
+            levels - number of possible values: default = LEVELS
+    return (C, levels) or (B, C, levels) array of counts
+    """
+    values = np.asarray(images)
+    if values.ndim == 2:
+        values = values[:, :, np.newaxis]
+    batch_shape = values.shape[:-3]
+    n_channels = values.shape[-1]
+    values = values.reshape(-1, values.shape[-3] * values.shape[-2],
+                            n_channels)
+
+    # Histogram (image, channel) starts at bin levels * (image * C + channel).
+    offsets = _channel_offsets(len(values) * n_channels, levels).reshape(
+      len(values), 1, n_channels)
+    counts = np.bincount((values + offsets).ravel(),
+                         minlength=len(values) * n_channels * levels)
+    return counts.reshape(batch_shape + (n_channels, levels))
+
+
+def update_histograms(histograms, original_values, encoded_values):
+    """ Function to derive the histograms of an encoded image from those of
+        the original by recounting only the changed region.
+        Parameters:
+            histograms - (C, levels) histograms of the original image
+            original_values - (N, C) pixels of the region in the original
+            encoded_values - (N, C) pixels of the same region after encoding
+    return (C, levels) histograms of the encoded image
+    """
+    n_channels, levels = histograms.shape
+    offsets = _channel_offsets(n_channels, levels)
+    size = n_channels * levels
+    original_values = np.asarray(original_values).reshape(-1, n_channels)
+    encoded_values = np.asarray(encoded_values).reshape(-1, n_channels)
+    delta = (np.bincount((encoded_values + offsets).ravel(), minlength=size)
+             - np.bincount((original_values + offsets).ravel(),
+                           minlength=size))
+    return histograms + delta.reshape(n_channels, levels)
+
+
+def entropy(histograms, per_channel=False):
+    """ Function to calculate the Shannon entropy (base 2) from histograms.
+        Parameters:
+            histograms - (..., C, levels) array returned by
+                         channel_histograms()
+            per_channel - entropy of every channel instead of all channels
+                          together (like skimage.measure.shannon_entropy):
+                          default = False
+    return entropy value(s), shape (...) or (..., C) if per_channel
+    """
+    counts = np.asarray(histograms, dtype=np.float64)
+    if not per_channel:
+        counts = counts.sum(axis=-2)
+    probabilities = counts / counts.sum(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(probabilities > 0,
+                         probabilities * np.log2(probabilities), 0)
+    return -terms.sum(axis=-1)
+
+
+def histogram_difference(original_histograms, encoded_histograms):
+    """ Function to calculate the share of samples whose value changed bin,
+        half the L1 distance of the normalized histograms (0 = identical
+        value distribution, 1 = disjoint).
+        Parameters:
+            original_histograms - (..., C, levels) array
+            encoded_histograms - (..., C, levels) array
+    return difference value(s), shape (..., C)
+    """
+    original = np.asarray(original_histograms, dtype=np.float64)
+    encoded = np.asarray(encoded_histograms, dtype=np.float64)
+    return (np.abs(original - encoded).sum(axis=-1)
+            / (2 * original.sum(axis=-1)))
+
+
+def chi_square_attack(histograms):
+    """ Function to run the chi-square attack (Westfeld and Pfitzmann) on
+        histograms. LSB replacement evens out the counts of every pair of
+        values 2i and 2i + 1; the p-value is the probability that the
+        observed pair counts are this even by chance, so values close to 1
+        indicate embedding.
+        Parameters:
+            histograms - (..., C, levels) array returned by
+                         channel_histograms()
+    return (chi-square statistic, p-value) arrays of shape (..., C)
+    """
+    counts = np.asarray(histograms, dtype=np.float64)
+    even = counts[..., 0::2]
+    expected = (even + counts[..., 1::2]) / 2
+
+    # Pairs which never occur carry no information.
+    occupied = expected > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terms = np.where(occupied, (even - expected)**2 / expected, 0)
+    statistic = terms.sum(axis=-1)
+    degrees_of_freedom = occupied.sum(axis=-1) - 1
+    with np.errstate(invalid="ignore"):
+        p_value = np.where(degrees_of_freedom > 0,
+                           chi2.sf(statistic,
+                                   np.maximum(degrees_of_freedom, 1)),
+                           np.nan)
+    return statistic, p_value
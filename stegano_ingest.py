@@ -0,0 +1,108 @@
+"""Continuous ingest of images arriving in a folder.
+
+An asyncio pipeline: a scanner polls the input folder and queues every new,
+completely written image; a fixed number of workers take images from the
+bounded queue and process them on a thread pool. When the queue is full the
+scanner waits, so a burst of thousands of files is worked off at a steady
+rate without piling up in memory.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from stegano_profiling import logger
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def scan_folder(folder, extensions=IMAGE_EXTENSIONS):
+    """ Function to list the image files in a folder and its subfolders.
+        Parameters:
+            folder - folder path
+            extensions - file endings of the images
+    return dictionary {file path: (size, modification time)}
+    """
+    files = {}
+    for root, dirs, file_names in os.walk(folder):
+        for file_name in file_names:
+            if file_name.endswith(extensions):
+                file_path = os.path.join(root, file_name)
+                try:
+                    status = os.stat(file_path)
+                except FileNotFoundError:
+                    continue
+                files[file_path] = (status.st_size, status.st_mtime)
+    return files
+
+
+async def _scanner(folder, queue, seen, extensions, poll_interval, stop):
+    """Queue files which did not change since the previous poll.
+    """
+    previous = {}
+    while not stop.is_set():
+        current = await asyncio.get_running_loop().run_in_executor(
+          None, scan_folder, folder, extensions)
+
+        # A file still being copied changes size or time between polls.
+        for file_path, status in current.items():
+            if file_path in seen or previous.get(file_path) != status:
+                continue
+            seen.add(file_path)
+            await queue.put(file_path)
+
+        previous = current
+        try:
+            await asyncio.wait_for(stop.wait(), poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def _worker(queue, executor, process_file):
+    """Process queued files one after another on the thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        file_path = await queue.get()
+        try:
+            await loop.run_in_executor(executor, process_file, file_path)
+        except Exception:
+            logger.exception("Processing %s failed", file_path)
+        finally:
+            queue.task_done()
+
+
+async def watch_folder(folder, process_file, extensions=IMAGE_EXTENSIONS,
+                       poll_interval=1.0, max_workers=4, queue_size=64,
+                       skip=(), stop=None):
+    """ Function to process every image that appears in a folder until
+        stop is set (or forever).
+        Parameters:
+            folder - folder to watch (including subfolders)
+            process_file - function(file path) doing the work; it runs on a
+                           worker thread and must write its outputs itself
+            extensions - file endings of the images:
+                           default = IMAGE_EXTENSIONS
+            poll_interval - seconds between two scans of the folder:
+                           default = 1.0
+            max_workers - number of images processed at the same time:
+                           default = 4
+            queue_size - maximum number of queued images before the scanner
+                           waits: default = 64
+            skip - file paths which are not processed (e.g. done before)
+            stop - asyncio.Event ending the watch; queued images are
+                           finished first: default = None (never stop)
+    """
+    stop = stop or asyncio.Event()
+    queue = asyncio.Queue(maxsize=queue_size)
+    seen = set(skip)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        workers = [asyncio.create_task(_worker(queue, executor, process_file))
+                   for _ in range(max_workers)]
+        try:
+            await _scanner(folder, queue, seen, extensions, poll_interval,
+                           stop)
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
@@ -0,0 +1,244 @@
+"""Input/output helpers for the batch encoding sweep in main_program.
+"""
+import csv
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+# Columns written for each (image, colour channels, bit depth) job.
+RESULT_FIELDS = ["ImageFile", "ColourCombination", "BitDepth", "PSNR", "MSE",
+                 "SSIM", "MSSSIM", "EntropyOriginal", "EntropyEncoded",
+                 "BrisqueOriginal", "BrisqueEncoded", "ChiSquareP", "RSRate",
+                 "SPARate"]
+
+# Serializes appends of concurrent workers (see stegano_ingest).
+_append_lock = threading.Lock()
+
+
+def job_key(image_file, colour_combination, bit_depth):
+    """Build the key identifying one job of the sweep
+
+        return (image file, colour combination, bit depth) tuple
+    """
+    return (str(image_file), str(colour_combination), int(bit_depth))
+
+
+def _repair_results_file(results_file):
+    """Drop a partially written last row left behind by an interrupted run.
+    """
+    with open(results_file, "rb+") as f:
+        content = f.read()
+        if content and not content.endswith(b"\n"):
+            f.truncate(content.rfind(b"\n") + 1)
+
+
+def load_completed_jobs(results_file):
+    """ Function to read which jobs already have results.
+        Parameters:
+            results_file - CSV file written by append_result()
+    return set of job keys (see job_key()) present in results_file
+    """
+    if not os.path.exists(results_file):
+        return set()
+
+    _repair_results_file(results_file)
+
+    completed = set()
+    with open(results_file, newline="") as f:
+        for row in csv.DictReader(f):
+            if None in row.values():
+                continue
+            completed.add(job_key(row["ImageFile"], row["ColourCombination"],
+                                  row["BitDepth"]))
+    return completed
+
+
+def append_result(results_file, result_entry):
+    """ Function to append one result row to the CSV results file. The row
+        is flushed to disk straight away so an interrupted sweep keeps
+        everything finished so far.
+        Parameters:
+            results_file - CSV file the row is appended to, created with a
+                           header row if it does not exist yet
+            result_entry - dictionary with (at least) the RESULT_FIELDS keys
+    """
+    with _append_lock:
+        fieldnames = RESULT_FIELDS
+        new_file = (not os.path.exists(results_file)
+                    or os.path.getsize(results_file) == 0)
+
+        # Keep the column order of an existing file.
+        if not new_file:
+            with open(results_file, newline="") as f:
+                fieldnames = next(csv.reader(f))
+
+        with open(results_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames,
+                                    extrasaction="ignore")
+            if new_file:
+                writer.writeheader()
+            writer.writerow(result_entry)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def export_results(results_file, excel_file):
+    """Convert the CSV results file to an Excel file. Without results (no
+       file or an empty one) an Excel file with only the header is written.
+    """
+    if os.path.exists(results_file) and os.path.getsize(results_file) > 0:
+        df = pd.read_csv(results_file)
+    else:
+        df = pd.DataFrame(columns=RESULT_FIELDS)
+    df.to_excel(excel_file, index=False)
+
+
+def _save_atomic(image, output_path, **params):
+    """Save an image under a temporary name and rename it, so readers never
+       see a partially written file.
+    """
+    image_format = Image.registered_extensions()[
+      os.path.splitext(output_path)[1].lower()]
+    temporary_path = output_path + ".tmp"
+    image.save(temporary_path, format=image_format, **params)
+    os.replace(temporary_path, output_path)
+
+
+def should_save(colour_combination, bit_depth, save_policy,
+                save_combinations=()):
+    """ Function to decide if an encoded image of the sweep gets saved.
+        Parameters:
+            colour_combination - colour channels used for encoding
+            bit_depth - number of bits used for encoding
+            save_policy - "all", "none" or "selected"
+            save_combinations - (colour channels, bit depth) pairs saved when
+                                save_policy is "selected"
+    return True if the encoded image should be saved
+    """
+    if save_policy == "all":
+        return True
+    elif save_policy == "none":
+        return False
+    elif save_policy == "selected":
+        return (colour_combination, bit_depth) in set(save_combinations)
+    else:
+        raise ValueError("Save policy not supported.")
+
+
+def save_encoded_image(original_image, encoded_image, output_path, n_bits,
+                       color_channels="RGB", save_content="image",
+                       compress_level=6):
+    """ Function to save the result of an encoding.
+        Parameters:
+            original_image - image before encoding (PIL.Image)
+            encoded_image - image returned by stegano_functions.encode()
+            output_path - file path without extension, the extension is
+                          added depending on save_content
+            n_bits - number of bits used for encoding
+            color_channels - colour channels used for encoding
+            save_content - "image" saves the encoded image in the format of
+                           the original file, "bitplanes" saves only the
+                           low n_bits of the encoded channels and "diff"
+                           saves the XOR between original and encoded image
+                           (both as PNG): default = "image"
+            compress_level - zlib compression level for PNG output, 0 is
+                             fastest and 9 smallest: default = 6
+    return file path of the saved image
+    """
+    if save_content == "image":
+        extension = (os.path.splitext(original_image.filename)[1]
+                     if getattr(original_image, "filename", "") else ".png")
+        output_path += extension
+        if extension.lower() == ".png":
+            _save_atomic(encoded_image, output_path,
+                         compress_level=compress_level)
+        else:
+            _save_atomic(encoded_image, output_path)
+        return output_path
+
+    encoded = np.asarray(encoded_image.convert("RGB"))
+    if save_content == "bitplanes":
+        mask = np.zeros(3, dtype=np.uint8)
+        for i, band in enumerate("RGB"):
+            if band in color_channels.upper():
+                mask[i] = (1 << n_bits) - 1
+        data = encoded & mask
+    elif save_content == "diff":
+        data = np.bitwise_xor(np.asarray(original_image.convert("RGB")),
+                              encoded)
+    else:
+        raise ValueError("Save content not supported.")
+
+    output_path += ".png"
+    _save_atomic(Image.fromarray(data), output_path,
+                 compress_level=compress_level)
+    return output_path
+
+
+def _load_image(image_path):
+    """Open and decode an image file.
+    """
+    image = Image.open(image_path)
+    image.load()
+    return image
+
+
+def prefetch_images(image_paths, queue_depth=4, max_workers=2):
+    """ Generator to load images on background threads while the caller 
+        works on the current one, so decoding overlaps with processing.
+        Parameters:
+            image_paths - file paths of the images
+            queue_depth - number of images decoded ahead: default = 4
+            max_workers - number of decoding threads: default = 2
+    yield (file path, decoded PIL image) in the order of image_paths
+    """
+    paths = iter(image_paths)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for image_path in paths:
+            pending.append((image_path, 
+                            executor.submit(_load_image, image_path)))
+            if len(pending) > queue_depth:
+                image_path, future = pending.popleft()
+                yield image_path, future.result()
+        while pending:
+            image_path, future = pending.popleft()
+            yield image_path, future.result()
+
+
+class BackgroundWriter:
+    """Run write jobs (saving images, appending results) in submission order
+       on one background thread. submit() blocks while max_pending jobs are 
+       waiting, which bounds the memory held by queued images.
+    """
+    def __init__(self, max_pending=16):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = deque()
+        self.max_pending = max_pending
+        
+    def submit(self, function, *args):
+        """Queue function(*args), re-raising errors of finished jobs.
+        """
+        while self.pending and (len(self.pending) >= self.max_pending 
+                                or self.pending[0].done()):
+            self.pending.popleft().result()
+        self.pending.append(self.executor.submit(function, *args))
+        
+    def close(self):
+        """Wait for all queued jobs.
+        """
+        try:
+            while self.pending:
+                self.pending.popleft().result()
+        finally:
+            self.executor.shutdown()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
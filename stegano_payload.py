@@ -0,0 +1,328 @@
+"""Compress and encrypt payloads on their way into the carrier.
+
+The payload is streamed through a compression codec (CODECS), with a
+passphrase through AES-GCM encryption and optionally through the
+error-correcting code of stegano_ecc straight into stegano.embed_stream(),
+so it is never held in memory as a whole. A header in front of the stored
+data records the codec, whether it is encrypted or error-corrected and the
+stored length; since the length is only known at the end, the header is
+written last. Extraction reads the header and streams the stored data back
+through the same stages.
+"""
+import hashlib
+import lzma
+import os
+import struct
+import zlib
+import stegano_ecc
+import stegano_functions as stegano
+
+try:
+    import zstandard
+except ImportError:
+    # zstandard is optional, only the "zstd" codec is then unavailable.
+    zstandard = None
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives.ciphers import (Cipher, algorithms,
+                                                        modes)
+except ImportError:
+    # cryptography is optional, payloads can then not be encrypted.
+    Cipher = None
+
+# Magic bytes, codec id, flags, stored length.
+PAYLOAD_HEADER = struct.Struct(">4sBBI")
+PAYLOAD_MAGIC = b"LSBP"
+
+# Salt of the key derivation, GCM nonce and GCM tag (follow the header of
+# encrypted payloads).
+CRYPTO_HEADER = struct.Struct(">16s12s16s")
+
+# Header flags of encrypted and error-corrected payloads.
+FLAG_ENCRYPTED = 1
+FLAG_ECC = 2
+
+# Codec name -> id stored in the header.
+CODECS = {"raw": 0, "zlib": 1, "lzma": 2, "zstd": 3}
+
+# PBKDF2-HMAC-SHA256 iterations deriving the AES-256 key from a passphrase.
+KDF_ITERATIONS = 200000
+
+# Number of bytes read at once from the payload and from the carrier.
+PAYLOAD_CHUNK_BYTES = 1 << 16
+
+# Errors of the decompressors on corrupted data.
+DECOMPRESSION_ERRORS = (zlib.error, lzma.LZMAError, EOFError) + (
+  (zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def available_codecs():
+    """List the codecs usable with the installed libraries
+    """
+    return [codec for codec in CODECS
+            if codec != "zstd" or zstandard is not None]
+
+
+def _check_codec(codec):
+    """Make sure a codec is known and its library is installed.
+    """
+    if codec not in CODECS:
+        raise ValueError("Unknown codec " + str(codec) + ", choose from "
+                         + ", ".join(CODECS) + ".")
+    if codec == "zstd" and zstandard is None:
+        raise ImportError("The zstd codec needs the zstandard package.")
+
+
+def _check_encryption():
+    """Make sure the library for encryption is installed.
+    """
+    if Cipher is None:
+        raise ImportError("Encryption needs the cryptography package.")
+
+
+def _source_chunks(payload):
+    """Split a payload (bytes, string or binary file object) into chunks
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        view = memoryview(payload)
+        for start in range(0, len(view), PAYLOAD_CHUNK_BYTES):
+            yield view[start:start + PAYLOAD_CHUNK_BYTES]
+    else:
+        yield from iter(lambda: payload.read(PAYLOAD_CHUNK_BYTES), b"")
+
+
+def _compress(chunks, codec):
+    """Stream chunks through the compressor of a codec
+    """
+    if codec == "raw":
+        yield from chunks
+        return
+    if codec == "zlib":
+        compressor = zlib.compressobj(9)
+    elif codec == "lzma":
+        compressor = lzma.LZMACompressor()
+    else:
+        compressor = zstandard.ZstdCompressor().compressobj()
+
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+
+def _decompress(chunks, codec):
+    """Stream chunks through the decompressor of a codec
+    """
+    if codec == "raw":
+        yield from chunks
+        return
+    if codec == "zlib":
+        decompressor = zlib.decompressobj()
+    elif codec == "lzma":
+        decompressor = lzma.LZMADecompressor()
+    else:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    # lzma and zstd reject any input after the end of their stream.
+    for chunk in chunks:
+        if chunk:
+            yield decompressor.decompress(chunk)
+    if codec == "zlib":
+        yield decompressor.flush()
+
+
+def _cipher(passphrase, salt, nonce, tag=None):
+    """AES-256-GCM cipher with the key derived from a passphrase
+    """
+    if isinstance(passphrase, str):
+        passphrase = passphrase.encode("utf-8")
+    key = hashlib.pbkdf2_hmac("sha256", passphrase, salt, KDF_ITERATIONS)
+    return Cipher(algorithms.AES(key), modes.GCM(nonce, tag))
+
+
+def _crypt(chunks, context, result=None):
+    """Stream chunks through an encryptor or decryptor. The encryption tag
+       is stored in result["tag"] once the stream is finished.
+    """
+    for chunk in chunks:
+        yield context.update(chunk)
+    try:
+        yield context.finalize()
+    except InvalidTag:
+        raise ValueError("Wrong passphrase or corrupted payload.")
+    if result is not None:
+        result["tag"] = context.tag
+
+
+def _ecc_chunks(chunks, result):
+    """Add the error-correcting code to a stream of chunks (whole blocks,
+       only the last one is padded). The number of data bytes is stored in
+       result["n_bytes"] once the stream is finished.
+    """
+    buffer = bytearray()
+    n_bytes = 0
+    for chunk in chunks:
+        buffer += chunk
+        n_bytes += len(chunk)
+        usable = len(buffer) - len(buffer) % stegano_ecc.BLOCK_BYTES
+        if usable:
+            yield stegano_ecc.encode(buffer[:usable])
+            del buffer[:usable]
+    yield stegano_ecc.encode(buffer)
+    result["n_bytes"] = n_bytes
+
+
+def _stored_size(n_bytes, ecc):
+    """Number of carrier bytes used for n_bytes data bytes
+    """
+    return stegano_ecc.encoded_size(n_bytes) if ecc else n_bytes
+
+
+def _header_size(encrypted, ecc):
+    """Number of carrier bytes used by the headers
+    """
+    return (_stored_size(PAYLOAD_HEADER.size, ecc)
+            + encrypted * _stored_size(CRYPTO_HEADER.size, ecc))
+
+
+def payload_capacity(image, n_bits=1, color_channels="RGB",
+                     encrypted=False, ecc=False):
+    """Calculate how many stored (compressed) bytes fit into an image
+
+        return number of bytes (the headers are already subtracted)
+    """
+    n_bytes = max(stegano.capacity(image, n_bits, color_channels,
+                                   terminator=False)
+                  - _header_size(encrypted, ecc), 0)
+    if ecc:
+        n_bytes = (n_bytes // stegano_ecc.CODE_BLOCK_BYTES
+                   * stegano_ecc.BLOCK_BYTES)
+    return n_bytes
+
+
+def embed_payload(original_image, payload, n_bits=1, color_channels="RGB",
+                  codec="zlib", passphrase=None, key=None, ecc=False):
+    """ Function to compress, optionally encrypt and embed a payload.
+        Parameters:
+            original_image - Image that will be used for data encoding.
+                             Coming from PIL.Image.Open()
+            payload - bytes, string (stored as UTF-8) or binary file object
+            n_bits - how many last bits to be used for encoding: default = 1
+            color_channels - which color channels to be used for encoding:
+                             default = "RGB"
+            codec - compression codec (see CODECS): default = "zlib"
+            passphrase - if given, the payload is encrypted with AES-GCM
+                         and a key derived from it: default = None
+            key - if given, pixels are used in a key-dependent scattered
+                  order: default = None
+            ecc - add the error-correcting code of stegano_ecc (halves the
+                  capacity, corrects single flipped bits): default = False
+    return encoded image
+    """
+    _check_codec(codec)
+    encrypted = passphrase is not None
+    flags = encrypted * FLAG_ENCRYPTED | ecc * FLAG_ECC
+    chunks = _compress(_source_chunks(payload), codec)
+    result = {}
+
+    if encrypted:
+        _check_encryption()
+        salt = os.urandom(16)
+        nonce = os.urandom(12)
+        encryptor = _cipher(passphrase, salt, nonce).encryptor()
+        encryptor.authenticate_additional_data(
+          PAYLOAD_MAGIC + bytes([CODECS[codec], flags]))
+        chunks = _crypt(chunks, encryptor, result)
+    if ecc:
+        chunks = _ecc_chunks(chunks, result)
+
+    def header(n_bytes):
+        data = PAYLOAD_HEADER.pack(PAYLOAD_MAGIC, CODECS[codec], flags,
+                                   result["n_bytes"] if ecc else n_bytes)
+        if ecc:
+            data = stegano_ecc.encode(data)
+        if encrypted:
+            crypto_data = CRYPTO_HEADER.pack(salt, nonce, result["tag"])
+            data += stegano_ecc.encode(crypto_data) if ecc else crypto_data
+        return data
+
+    return stegano.embed_stream(original_image, chunks, n_bits,
+                                color_channels,
+                                byte_offset=_header_size(encrypted, ecc),
+                                key=key, header=header)
+
+
+def extract_payload(image, n_bits=1, color_channels="RGB", passphrase=None,
+                    key=None, output=None):
+    """ Function to read a payload embedded with embed_payload().
+        Parameters:
+            image - image coming from PIL.Image.Open()
+            n_bits - how many last bits were used for encoding: default = 1
+            color_channels - which color channels were used for encoding:
+                             default = "RGB"
+            passphrase - passphrase of an encrypted payload: default = None
+            key - key used for encoding: default = None
+            output - if given, binary file object the payload is written to
+                     while it is decoded instead of returning it (an
+                     encrypted payload is only authenticated once the
+                     function returns without error): default = None
+    return payload bytes (None if output is given)
+    """
+    read_stored = stegano.carrier_reader(image, n_bits, color_channels,
+                                         key=key)
+
+    # Error-corrected headers do not start with the plain magic bytes.
+    header = read_stored(PAYLOAD_HEADER.size)
+    ecc = not header.startswith(PAYLOAD_MAGIC)
+    if ecc:
+        header = stegano_ecc.decode(header + read_stored(
+          _stored_size(PAYLOAD_HEADER.size, ecc) - PAYLOAD_HEADER.size))
+
+    def read(n_bytes):
+        if not ecc:
+            return read_stored(n_bytes)
+        return stegano_ecc.decode(read_stored(
+          _stored_size(n_bytes, ecc)))[:n_bytes]
+
+    magic, codec_id, flags, length = PAYLOAD_HEADER.unpack(
+      header[:PAYLOAD_HEADER.size])
+    codec_names = {value: name for name, value in CODECS.items()}
+    encrypted = bool(flags & FLAG_ENCRYPTED)
+    if (magic != PAYLOAD_MAGIC or codec_id not in codec_names
+            or bool(flags & FLAG_ECC) != ecc
+            or length > payload_capacity(image, n_bits, color_channels,
+                                         encrypted, ecc)):
+        raise ValueError("No payload found in the image.")
+    codec = codec_names[codec_id]
+    _check_codec(codec)
+
+    if encrypted:
+        _check_encryption()
+        if passphrase is None:
+            raise ValueError("The payload is encrypted, a passphrase is "
+                             "needed.")
+        salt, nonce, tag = CRYPTO_HEADER.unpack(read(CRYPTO_HEADER.size))
+
+    chunks = (read(min(PAYLOAD_CHUNK_BYTES, length - offset))
+              for offset in range(0, length, PAYLOAD_CHUNK_BYTES))
+    if encrypted:
+        decryptor = _cipher(passphrase, salt, nonce, tag).decryptor()
+        decryptor.authenticate_additional_data(
+          PAYLOAD_MAGIC + bytes([codec_id, flags]))
+        chunks = _crypt(chunks, decryptor)
+
+    pieces = []
+    try:
+        for piece in _decompress(chunks, codec):
+            if output is not None:
+                output.write(piece)
+            else:
+                pieces.append(piece)
+    except DECOMPRESSION_ERRORS as error:
+        # Decrypted data is decompressed before the tag can be checked.
+        if encrypted:
+            raise ValueError("Wrong passphrase or corrupted payload.")
+        raise ValueError("Corrupted payload: " + str(error))
+    return None if output is not None else b"".join(pieces)
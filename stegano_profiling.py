@@ -0,0 +1,144 @@
+"""Timing, counters and profiling hooks for encoding and the quality measures.
+
+Instrumentation is off by default. stage() and count() then return after a
+single flag check, so the hooks can stay in the hot path. Messages go to the
+"stegano" logger, which has no output unless the application configures
+logging.
+"""
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("stegano")
+logger.addHandler(logging.NullHandler())
+
+_enabled = False
+_timings = defaultdict(list)
+_counters = defaultdict(int)
+_no_stage = nullcontext()
+
+
+def enable(enabled=True):
+    """Switch stage timers and counters on or off.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    """Check if stage timers and counters are switched on
+    """
+    return _enabled
+
+
+def reset():
+    """Forget all recorded timings and counters.
+    """
+    _timings.clear()
+    _counters.clear()
+
+
+@contextmanager
+def _timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings[name].append(time.perf_counter() - start)
+
+
+def stage(name):
+    """ Function to time a stage of the processing, used as
+        "with stage("encode"): ...".
+        Parameters:
+            name - name of the stage
+    return context manager
+    """
+    if not _enabled:
+        return _no_stage
+    return _timed_stage(name)
+
+
+def count(name, amount=1):
+    """Add amount to the counter called name (e.g. pixels processed).
+    """
+    if _enabled:
+        _counters[name] += amount
+
+
+def summary():
+    """ Function to summarize the recorded timings and counters.
+    return dictionary {"stages": {name: {"calls", "total_s", "mean_s",
+           "last_s"}}, "counters": {name: value}}
+    """
+    stages = {name: {"calls": len(times),
+                     "total_s": sum(times),
+                     "mean_s": sum(times) / len(times),
+                     "last_s": times[-1]}
+              for name, times in _timings.items() if times}
+    return {"stages": stages, "counters": dict(_counters)}
+
+
+def format_last_timings():
+    """Format the last duration of every stage for a status line
+
+        return string like "encode 12 ms | ssim 40 ms"
+    """
+    return " | ".join(f"{name} {1000 * times[-1]:.0f} ms"
+                      for name, times in _timings.items() if times)
+
+
+def write_metrics(file_path, **fields):
+    """ Function to append the current summary as one JSON line to a file.
+        Parameters:
+            file_path - metrics file (JSON lines)
+            fields - extra values stored with the summary (e.g. image file)
+    """
+    record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    record.update(fields)
+    record.update(summary())
+    with open(file_path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def profile(cpu_file=None, memory=False, top=20):
+    """ Function to capture a cProfile and/or tracemalloc profile of a block,
+        used as "with profile("sweep.prof", memory=True): ...".
+        Parameters:
+            cpu_file - file the cProfile statistics are dumped to (readable
+                       with pstats/snakeviz), None disables cProfile:
+                       default = None
+            memory - log the top allocation sites and the peak traced
+                     memory: default = False
+            top - number of functions/allocation sites logged: default = 20
+    """
+    profiler = cProfile.Profile() if cpu_file else None
+    if memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cpu_file)
+            if logger.isEnabledFor(logging.INFO):
+                stream = io.StringIO()
+                stats = pstats.Stats(profiler, stream=stream)
+                stats.sort_stats("cumulative").print_stats(top)
+                logger.info("%s", stream.getvalue())
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            logger.info("Peak traced memory: %.1f MB", peak / 2**20)
+            for line in snapshot.statistics("lineno")[:top]:
+                logger.info("%s", line)
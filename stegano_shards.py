@@ -0,0 +1,197 @@
+"""Split one payload across several carrier images.
+
+Every carrier holds one shard: a small header followed by a slice of the
+payload. The header stores the shard index, the total number of shards, the
+slice length, a CRC-32 checksum of the slice and one of the whole payload,
+so the shards can be decoded from the encoded images in any order and
+shards of different payloads are not mixed up.
+"""
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import stegano_functions as stegano
+
+# Magic bytes, shard index, number of shards, slice length, CRC-32 of the
+# slice, CRC-32 of the payload.
+SHARD_HEADER = struct.Struct(">4sHHIII")
+SHARD_MAGIC = b"LSBS"
+
+
+def shard_capacity(image, n_bits=1, color_channels="RGB"):
+    """Calculate how many payload bytes one carrier image can hold
+
+        return number of bytes (the shard header is already subtracted)
+    """
+    n_bytes = stegano.capacity(image, n_bits, color_channels,
+                               terminator=False)
+    return max(n_bytes - SHARD_HEADER.size, 0)
+
+
+def split_payload(payload, carrier_sizes, n_bits=1, color_channels="RGB"):
+    """ Function to split a payload into shards which fit the carriers.
+        Carriers are filled in the given order, each one up to its capacity.
+        Carriers which cannot hold the header and at least one payload byte
+        are skipped.
+        Parameters:
+            payload - bytes to be split
+            carrier_sizes - (width, height, bands) of each carrier image
+                            (bands are the channel letters, e.g. "RGBA";
+                            without them every requested channel counts)
+            n_bits - how many last bits to be used for encoding: default = 1
+            color_channels - which color channels to be used for encoding:
+                             default = "RGB"
+    return list with one entry per carrier: its shard (header + slice) or
+           None if the carrier is skipped or not needed
+    """
+    slices = []
+    position = 0
+    for size in carrier_sizes:
+        n_bytes = shard_capacity(size, n_bits, color_channels)
+        if n_bytes == 0 or (position >= len(payload)
+                            and any(data is not None for data in slices)):
+            slices.append(None)
+            continue
+        slices.append(payload[position:position + n_bytes])
+        position += n_bytes
+
+    if position < len(payload) or all(data is None for data in slices):
+        raise ValueError("Payload does not fit into the carrier images.")
+
+    total = sum(data is not None for data in slices)
+    checksum = zlib.crc32(payload)
+    shards = []
+    index = 0
+    for data in slices:
+        if data is not None:
+            data = SHARD_HEADER.pack(SHARD_MAGIC, index, total, len(data),
+                                     zlib.crc32(data), checksum) + data
+            index += 1
+        shards.append(data)
+    return shards
+
+
+def _encode_shard(carrier_path, output_path, shard, n_bits, color_channels,
+                  key):
+    """Embed one shard into a carrier and save it as a lossless image.
+    """
+    with Image.open(carrier_path) as carrier:
+        encoded_image = stegano.embed_bytes(carrier, shard, n_bits,
+                                            color_channels, key=key)
+    encoded_image.save(output_path, format="PNG")
+    return output_path
+
+
+def encode_shards(payload, carrier_paths, output_paths, n_bits=1,
+                  color_channels="RGB", key=None, max_workers=None):
+    """ Function to hide a payload across several carrier images. The
+        shards are embedded and saved in parallel.
+        Parameters:
+            payload - bytes (or string) to be hidden
+            carrier_paths - file paths of the carrier images
+            output_paths - file paths of the encoded images (saved as PNG),
+                           one per carrier
+            n_bits - how many last bits to be used for encoding: default = 1
+            color_channels - which color channels to be used for encoding:
+                             default = "RGB"
+            key - if given, pixels are used in a key-dependent scattered
+                             order: default = None
+            max_workers - number of worker threads: default = None
+                          (ThreadPoolExecutor default)
+    return list of file paths of the encoded images (unused carriers and
+           carriers too small for a shard are not saved)
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+
+    # Opening an image only reads its header, the pixels are not decoded.
+    carrier_sizes = []
+    for carrier_path in carrier_paths:
+        with Image.open(carrier_path) as carrier:
+            carrier_sizes.append(carrier.size
+                                 + (stegano._image_bands(carrier),))
+
+    # Keep the paths of the carriers which get a shard.
+    used = [(carrier_path, output_path, shard) for carrier_path, output_path,
+            shard in zip(carrier_paths, output_paths,
+                         split_payload(payload, carrier_sizes, n_bits,
+                                       color_channels))
+            if shard is not None]
+    carrier_paths, output_paths, shards = zip(*used)
+    n_shards = len(shards)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(
+          _encode_shard, carrier_paths, output_paths, shards,
+          [n_bits] * n_shards, [color_channels] * n_shards, [key] * n_shards))
+
+
+def _decode_shard(image_path, n_bits, color_channels, key):
+    """Read the shard header and slice of one encoded image.
+
+        return (index, total, payload checksum, slice) or None if the image
+               holds no shard
+    """
+    with Image.open(image_path) as image:
+        image.load()
+    header = stegano.extract_bytes(image, SHARD_HEADER.size, n_bits,
+                                   color_channels, key=key)
+    (magic, index, total, length, checksum,
+     payload_checksum) = SHARD_HEADER.unpack(header)
+    if magic != SHARD_MAGIC or length > shard_capacity(image, n_bits,
+                                                       color_channels):
+        return None
+
+    data = stegano.extract_bytes(image, length, n_bits, color_channels,
+                                 byte_offset=SHARD_HEADER.size, key=key)
+    if zlib.crc32(data) != checksum:
+        raise ValueError("Checksum of shard " + str(index) + " in "
+                         + str(image_path) + " does not match.")
+    return index, total, payload_checksum, data
+
+
+def decode_shards(image_paths, n_bits=1, color_channels="RGB", key=None,
+                  max_workers=None):
+    """ Function to reassemble a payload hidden with encode_shards().
+        The images can be given in any order and may include images
+        without a shard, which are ignored.
+        Parameters:
+            image_paths - file paths of the encoded images
+            n_bits - how many last bits were used for encoding: default = 1
+            color_channels - which color channels were used for encoding:
+                             default = "RGB"
+            key - key used for encoding: default = None
+            max_workers - number of worker threads: default = None
+                          (ThreadPoolExecutor default)
+    return payload bytes
+    """
+    image_paths = list(image_paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        decoded = executor.map(_decode_shard, image_paths,
+                               [n_bits] * len(image_paths),
+                               [color_channels] * len(image_paths),
+                               [key] * len(image_paths))
+        shards = [shard for shard in decoded if shard is not None]
+
+    if not shards:
+        raise ValueError("No shards found in the images.")
+
+    # All shards have to agree on the payload they belong to.
+    payloads = {(total, payload_checksum)
+                for _, total, payload_checksum, _ in shards}
+    if len(payloads) > 1:
+        raise ValueError("The images hold shards of different payloads.")
+    total, payload_checksum = payloads.pop()
+
+    slices = {}
+    for index, _, _, data in shards:
+        if index >= total or slices.setdefault(index, data) != data:
+            raise ValueError("The images hold shards of different payloads.")
+    missing = sorted(set(range(total)) - set(slices))
+    if missing:
+        raise ValueError("Missing shards: " + str(missing))
+
+    payload = b"".join(slices[index] for index in range(total))
+    if zlib.crc32(payload) != payload_checksum:
+        raise ValueError("Checksum of the payload does not match.")
+    return payload
@@ -3,7 +3,9 @@ import math
 import numpy as np
 from brisque import BRISQUE
 from numpy import asarray
+from scipy.ndimage import uniform_filter
 import skimage.measure
+import stegano_histogram as histogram
 
 
 def get_psnr(mse):
@@ -16,22 +18,14 @@ def get_psnr(mse):
 
 
 def get_mse(original_image, encoded_image):
-    """Calculate the Mean Squared Error (mse)
+    """Calculate the Mean Squared Error (mse) over the RGB values of all 
+       pixels (see get_mse_batch())
     
         return mse rounded to 3 decimal places
     """
-    height = original_image.height
-    width = original_image.width
-    mse_sum = 0.0
-    
-    # Extract RGB values from each pixel in original and encoded image.
-    for i in range(height):
-        for j in range(width): 
-            r1, g1, b1 = original_image.getpixel((j, i))
-            r2, g2, b2 = encoded_image.getpixel((j, i))
-            mse_sum += ((r1 - r2) ** 2) + ((g1 - g2) ** 2) + ((b1 - b2) ** 2)
-    mse = mse_sum / (400 * 400 * 3)
-    return str(round(mse,3))
+    mse = get_mse_batch([np.asarray(original_image.convert('RGB'))], 
+                        [np.asarray(encoded_image.convert('RGB'))])[0]
+    return str(round(float(mse),3))
 
 
 def get_ssim(original_image, encoded_image):
@@ -47,6 +41,17 @@ def get_ssim(original_image, encoded_image):
     return str(round(ssim,3))
 
 
+def get_msssim(original_image, encoded_image):
+    """Calculate the Multi-scale structural similarity index measure 
+       (ms-ssim)
+    
+        return ms-ssim rounded to 3 decimal places
+    """
+    msssim = sewar.msssim(np.asarray(original_image), 
+                          np.asarray(encoded_image))
+    return str(round(float(np.real(msssim)),3))
+
+
 def get_entropy(image):
     """Calculate the entropy
     
@@ -64,4 +69,133 @@ def get_brisque(image):
     numpydata = asarray(image)
     object = BRISQUE(url=False)
     result = object.score(numpydata)
-    return str(float(round(result, 3)))
\ No newline at end of file
+    return str(float(round(result, 3)))
+
+
+def _as_batch(images):
+    """Stack a list of same-size arrays to a (B, H, W, C) float64 array.
+    """
+    batch = np.stack(images) if isinstance(images, list) else images
+    batch = np.asarray(batch, dtype=np.float64)
+    return batch[..., np.newaxis] if batch.ndim == 3 else batch
+
+
+def get_mse_batch(original_images, encoded_images):
+    """Calculate the Mean Squared Error (mse) of every image pair of a batch
+    
+        return array of mse values
+    """
+    difference = _as_batch(original_images) - _as_batch(encoded_images)
+    return np.mean(difference * difference, axis=(1, 2, 3))
+
+
+def get_psnr_batch(mse):
+    """Calculate the Peak signal-to-noise ratio (psnr) from batch mse values
+    
+        return array of psnr values (inf for identical images)
+    """
+    with np.errstate(divide="ignore"):
+        return 20 * np.log10(255 / np.sqrt(np.asarray(mse, dtype=np.float64)))
+
+
+def _window_mean(x, ws):
+    """Mean over every ws x ws window of a (B, H, W) or (B, H, W, C) array,
+       restricted to the "valid" region like filter2(..., 'valid').
+    """
+    size = (1, ws, ws) + (1,) * (x.ndim - 3)
+    s = ws // 2
+    valid = (slice(None), slice(s, x.shape[1] - (ws - 1 - s)), 
+             slice(s, x.shape[2] - (ws - 1 - s)))
+    return uniform_filter(x, size)[valid]
+
+
+def _ssim_map(mu_GT, sigma_GT_sq, GT, P, ws, C1, C2):
+    """Calculate the ssim map from the (precomputed) moments of GT.
+    """
+    mu_P = _window_mean(P, ws)
+    sigma_P_sq = _window_mean(P * P, ws) - mu_P * mu_P
+    sigma_GT_P = _window_mean(GT * P, ws) - mu_GT * mu_P
+    return (((2 * mu_GT * mu_P + C1) * (2 * sigma_GT_P + C2)) 
+            / ((mu_GT * mu_GT + mu_P * mu_P + C1) 
+               * (sigma_GT_sq + sigma_P_sq + C2)))
+
+
+def get_ssim_batch(original_images, encoded_images, ws=11, K1=0.01, K2=0.03,
+                   MAX=255):
+    """Calculate the Structural similarity index measure (ssim) of every 
+       image pair of a batch, like sewar.ssim (uniform ws x ws window, 
+       "valid" region, mean over channels).
+    
+        return array of ssim values
+    """
+    GT = _as_batch(original_images)
+    P = _as_batch(encoded_images)
+    C1 = (K1 * MAX)**2
+    C2 = (K2 * MAX)**2
+    
+    mu_GT = _window_mean(GT, ws)
+    sigma_GT_sq = _window_mean(GT * GT, ws) - mu_GT * mu_GT
+    ssim_map = _ssim_map(mu_GT, sigma_GT_sq, GT, P, ws, C1, C2)
+    return np.mean(ssim_map, axis=(1, 2, 3))
+
+
+def get_reference_statistics(original_image, ws=11):
+    """ Function to precompute the per-channel parts of mse and ssim which
+        only depend on the original image, so they can be reused for every
+        encoding of it (see get_channel_statistics()).
+        Parameters:
+            original_image - original image as (H, W, C) array or PIL image
+            ws - ssim window size: default = 11
+    return dictionary with the image and its per-channel window moments
+    """
+    GT = np.asarray(original_image, dtype=np.float64)
+    GT = GT[:, :, np.newaxis] if GT.ndim == 2 else GT
+    mu_GT = _window_mean(GT[np.newaxis], ws)[0]
+    sigma_GT_sq = _window_mean((GT * GT)[np.newaxis], ws)[0] - mu_GT * mu_GT
+    return {"GT": GT, "mu": mu_GT, "sigma_sq": sigma_GT_sq, "ws": ws}
+
+
+def get_channel_statistics(reference, encoded_images, color_channels="RGB",
+                           K1=0.01, K2=0.03, MAX=255):
+    """ Function to calculate the per-channel squared error and ssim of a
+        batch of encodings of one original image. Only the channels in 
+        color_channels are computed; the other channels are unchanged by 
+        encoding, so their squared error is 0 and their ssim is 1.
+        Parameters:
+            reference - dictionary returned by get_reference_statistics()
+            encoded_images - (B, H, W, C) array or list of (H, W, C) arrays
+            color_channels - channels changed by the encoding: 
+                             default = "RGB"
+            K1, K2, MAX - ssim constants as in sewar.ssim
+    return (sum of squared errors, ssim) arrays of shape (B, C); the mse is 
+           sse.sum(axis=1) / image size and the ssim ssim.mean(axis=1)
+    """
+    P = _as_batch(encoded_images)
+    C1 = (K1 * MAX)**2
+    C2 = (K2 * MAX)**2
+    
+    sse = np.zeros((P.shape[0], P.shape[3]))
+    ssim = np.ones((P.shape[0], P.shape[3]))
+    for c, band in enumerate("RGB"[:P.shape[3]]):
+        if band not in color_channels.upper():
+            continue
+        GT_c = reference["GT"][np.newaxis, :, :, c]
+        P_c = P[:, :, :, c]
+        difference = GT_c - P_c
+        sse[:, c] = np.sum(difference * difference, axis=(1, 2))
+        ssim_map = _ssim_map(reference["mu"][np.newaxis, :, :, c], 
+                             reference["sigma_sq"][np.newaxis, :, :, c], 
+                             GT_c, P_c, reference["ws"], C1, C2)
+        ssim[:, c] = np.mean(ssim_map, axis=(1, 2))
+    return sse, ssim
+
+
+def get_entropy_batch(images):
+    """Calculate the entropy of every image of a batch, like 
+       skimage.measure.shannon_entropy (all channels in one histogram)
+    
+        return array of entropy values
+    """
+    batch = np.asarray(np.stack(images) if isinstance(images, list) 
+                       else images, dtype=np.uint8)
+    return histogram.entropy(histogram.channel_histograms(batch))
@@ -0,0 +1,188 @@
+"""Detectors for LSB replacement.
+
+Three classic attacks, vectorized over whole images (or batches of images):
+
+  - chi-square attack (Westfeld and Pfitzmann): p-value that the pairs of
+    values 2i, 2i + 1 were evened out by embedding,
+  - RS analysis (Fridrich, Goljan and Du): estimated embedding rate from
+    the regular/singular groups under LSB flipping,
+  - sample pair analysis (Dumitrescu, Wu and Wang): estimated embedding
+    rate from the trace sets of horizontally adjacent pixels.
+
+Every detector works on each block_size x block_size block of each channel
+and returns the scores of the whole image and of every block. The counts
+of the blocks add up to the counts of the (cropped) image, so the image
+score costs nothing extra. Only the least significant bit is analysed.
+"""
+import numpy as np
+import stegano_histogram as histogram
+
+# Side length of the analysed blocks (RS needs a multiple of 4).
+BLOCK_SIZE = 64
+
+# RS mask: the middle two pixels of each group of four are flipped.
+RS_MASK = np.array([0, 1, 1, 0], dtype=bool)
+
+
+def _blocks(images, block_size):
+    """View images as (B, rows, block_size, columns, block_size, C) blocks,
+       cropping the pixels which do not fill a whole block.
+    """
+    values = np.asarray(images)
+    if values.ndim == 2:
+        values = values[:, :, np.newaxis]
+    if values.ndim == 3:
+        values = values[np.newaxis]
+    B, H, W, C = values.shape
+    block_size = min(block_size, H, W) // 4 * 4
+    if block_size == 0:
+        raise ValueError("Images must be at least 4 x 4 pixels.")
+    rows, columns = H // block_size, W // block_size
+    values = values[:, :rows * block_size, :columns * block_size]
+    return values.reshape(B, rows, block_size, columns, block_size, C)
+
+
+def _squeeze(images, scores):
+    """Drop the batch axis again if a single image was analysed.
+    """
+    return scores[0] if np.ndim(images) < 4 else scores
+
+
+def _smaller_root(a, b, c):
+    """Root of a x^2 + b x + c = 0 with the smaller absolute value (the real
+       part -b / 2a if the roots are complex, which happens near full
+       embedding).
+    """
+    a, b, c = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64)
+                                    for v in (a, b, c)))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(np.maximum(b * b - 4 * a * c, 0))
+        roots = np.stack([(-b + root) / (2 * a), (-b - root) / (2 * a)])
+        quadratic = np.take_along_axis(
+          roots, np.argmin(np.abs(np.nan_to_num(roots, nan=np.inf)),
+                           axis=0)[np.newaxis], axis=0)[0]
+        return np.where(a == 0, -c / b, quadratic)
+
+
+def chi_square(images, block_size=BLOCK_SIZE):
+    """ Function to run the chi-square attack on every block and channel.
+        Parameters:
+            images - (H, W), (H, W, C) or (B, H, W, C) array of integers
+            block_size - side length of the blocks: default = BLOCK_SIZE
+    return (image p-values of shape (..., C), block p-values of shape
+           (..., rows, columns, C)); values close to 1 indicate embedding
+    """
+    blocks = _blocks(images, block_size)
+    B, rows, _, columns, _, C = blocks.shape
+    levels = (int(blocks.max()) + 2) & ~1
+
+    # One histogram per block and channel, from a single bincount.
+    block_images = blocks.transpose(0, 1, 3, 2, 4, 5).reshape(
+      B * rows * columns, blocks.shape[2], blocks.shape[4], C)
+    block_histograms = histogram.channel_histograms(
+      block_images, levels).reshape(B, rows, columns, C, levels)
+
+    _, block_p = histogram.chi_square_attack(block_histograms)
+    _, image_p = histogram.chi_square_attack(
+      block_histograms.sum(axis=(1, 2)))
+    return _squeeze(images, image_p), _squeeze(images, block_p)
+
+
+def _rs_counts(groups):
+    """Count regular minus singular groups under the mask M and -M.
+
+        return (R_M - S_M, R_-M - S_-M) arrays of shape (B, rows, columns, C)
+    """
+    def smoothness(values):
+        return np.abs(np.diff(values, axis=5)).sum(axis=5)
+
+    f = smoothness(groups)
+    flipped = np.where(RS_MASK[:, np.newaxis], groups ^ 1, groups)
+    shifted = np.where(RS_MASK[:, np.newaxis], ((groups + 1) ^ 1) - 1,
+                       groups)
+
+    # Regular groups get rougher under flipping, singular ones smoother.
+    counts = []
+    for changed in (flipped, shifted):
+        sign = np.sign(smoothness(changed) - f)
+        counts.append(sign.sum(axis=(2, 4)))
+    return counts
+
+
+def rs_analysis(images, block_size=BLOCK_SIZE):
+    """ Function to estimate the LSB embedding rate with RS analysis on
+        every block and channel (horizontal groups of four pixels).
+        Parameters:
+            images - (H, W), (H, W, C) or (B, H, W, C) array of integers
+            block_size - side length of the blocks: default = BLOCK_SIZE
+    return (image rates of shape (..., C), block rates of shape
+           (..., rows, columns, C)); 0 = clean, 1 = every LSB carries data
+    """
+    blocks = _blocks(images, block_size).astype(np.int32)
+    B, rows, size, columns, _, C = blocks.shape
+    groups = blocks.reshape(B, rows, size, columns, size // 4, 4, C)
+
+    # Differences of the image and of the image with all LSBs flipped.
+    d0, dn0 = _rs_counts(groups)
+    d1, dn1 = _rs_counts(groups ^ 1)
+
+    def rate(d0, d1, dn0, dn1):
+        x = _smaller_root(2 * (d1 + d0), dn0 - dn1 - d1 - 3 * d0, d0 - dn0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.clip(x / (x - 0.5), 0, 1)
+
+    image_rate = rate(*(d.sum(axis=(1, 2)) for d in (d0, d1, dn0, dn1)))
+    block_rate = rate(d0, d1, dn0, dn1)
+    return _squeeze(images, image_rate), _squeeze(images, block_rate)
+
+
+def sample_pair_analysis(images, block_size=BLOCK_SIZE):
+    """ Function to estimate the LSB embedding rate with sample pair
+        analysis on every block and channel (horizontal pixel pairs).
+        Parameters:
+            images - (H, W), (H, W, C) or (B, H, W, C) array of integers
+            block_size - side length of the blocks: default = BLOCK_SIZE
+    return (image rates of shape (..., C), block rates of shape
+           (..., rows, columns, C)); 0 = clean, 1 = every LSB carries data
+    """
+    blocks = _blocks(images, block_size).astype(np.int32)
+    u = blocks[:, :, :, :, :-1]
+    v = blocks[:, :, :, :, 1:]
+
+    # X: pairs moving apart under LSB flipping of v, Y: pairs moving closer,
+    #
+    # K: pairs in the same trace set (u // 2 == v // 2).
+    v_even = (v & 1) == 0
+    x = np.where(v_even, u < v, u > v).sum(axis=(2, 4))
+    y = np.where(v_even, u > v, u < v).sum(axis=(2, 4))
+    k = ((u >> 1) == (v >> 1)).sum(axis=(2, 4))
+    n = u.shape[2] * u.shape[4]
+
+    def rate(x, y, k, n):
+        return np.clip(_smaller_root(k / 2, 2 * x - n, y - x), 0, 1)
+
+    image_rate = rate(x.sum(axis=(1, 2)), y.sum(axis=(1, 2)),
+                      k.sum(axis=(1, 2)), n * x.shape[1] * x.shape[2])
+    block_rate = rate(x, y, k, n)
+    return _squeeze(images, image_rate), _squeeze(images, block_rate)
+
+
+# Detectors run by analyse(): name -> function(images, block_size).
+DETECTORS = {
+    "ChiSquare": chi_square,
+    "RS": rs_analysis,
+    "SPA": sample_pair_analysis,
+}
+
+
+def analyse(images, block_size=BLOCK_SIZE, detectors=DETECTORS):
+    """ Function to run several detectors on the same images.
+        Parameters:
+            images - (H, W), (H, W, C) or (B, H, W, C) array of integers
+            block_size - side length of the blocks: default = BLOCK_SIZE
+            detectors - dictionary {name: detector function}:
+                        default = DETECTORS
+    return dictionary {name: (image scores, block scores)}
+    """
+    return {name: detector(images, block_size)
+            for name, detector in detectors.items()}
@@ -0,0 +1,245 @@
+"""Perceptibility verdict of an encoded image.
+
+Every image quality measure is rated green, yellow or red against the
+thresholds concluded from the experiments (THRESHOLDS). A yellow or red
+measure counts as perceptible and the number of perceptible measures gives
+the verdict: fewer than VERDICT_LIMIT "Good!", exactly VERDICT_LIMIT "?"
+and more "Bad!".
+
+The measures are computed cheapest first (STAGES) and evaluation stops as
+soon as the remaining measures can no longer change the verdict, unless
+every value is wanted for reporting (full=True). tune() uses this to find
+the encoding setting with the highest capacity that stays "Good!".
+"""
+import numpy as np
+import stegano_functions as stegano
+import stegano_histogram as histogram
+import stegano_profiling as profiling
+import stegano_statistics as statistics
+
+# Thresholds concluded from the experiments: measure -> (red limit, yellow
+# limit, True if higher values are worse). A value reaching a limit gets its
+# rating; the entropy delta only has a red limit, which must be exceeded.
+THRESHOLDS = {
+    "MSE": (206.13825, 7.1765, True),
+    "PSNR": (25.0985, 39.6945, False),
+    "SSIM": (0.80291, 0.9865, False),
+    "Entropy": (0.02975, None, True),
+    "BRISQUE": (22.79, 6.309, True),
+}
+
+# Limits which have to be exceeded instead of reached.
+STRICT_LIMITS = {"Entropy"}
+
+# Number of perceptible measures giving the "?" verdict.
+VERDICT_LIMIT = 3
+
+
+def rate(measure, value):
+    """ Function to rate one image quality measure against THRESHOLDS.
+        Parameters:
+            measure - name of the measure (key of THRESHOLDS)
+            value - value of the measure (for Entropy and BRISQUE the
+                    difference between original and encoded image)
+    return "red", "yellow" or "green"
+    """
+    red, yellow, higher_is_worse = THRESHOLDS[measure]
+    strict = measure in STRICT_LIMITS
+
+    def reaches(limit):
+        if limit is None:
+            return False
+        if not higher_is_worse:
+            return value < limit if strict else value <= limit
+        return value > limit if strict else value >= limit
+
+    if reaches(red):
+        return "red"
+    elif reaches(yellow):
+        return "yellow"
+    return "green"
+
+
+def verdict(n_perceptible):
+    """Combine the number of perceptible measures to "Good!", "?" or "Bad!"
+    """
+    if n_perceptible < VERDICT_LIMIT:
+        return "Good!"
+    elif n_perceptible == VERDICT_LIMIT:
+        return "?"
+    return "Bad!"
+
+
+def _score_mse_psnr(original, encoded, color_channels, reference):
+    """MSE and PSNR (one pass over the pixels)
+    """
+    difference = original.astype(np.float64) - encoded
+    mse = round(float(np.mean(difference * difference)), 3)
+    psnr = (round(20 * np.log10(255 / np.sqrt(mse)), 3) if mse > 0
+            else float("inf"))
+    return {"MSE": mse, "PSNR": psnr}
+
+
+def _score_entropy(original, encoded, color_channels, reference):
+    """Entropy of both images and their difference
+    """
+    if "EntropyOriginal" not in reference:
+        reference["EntropyOriginal"] = round(float(histogram.entropy(
+          histogram.channel_histograms(original))), 3)
+    entropy_encoded = round(float(histogram.entropy(
+      histogram.channel_histograms(encoded))), 3)
+    return {"EntropyOriginal": reference["EntropyOriginal"],
+            "EntropyEncoded": entropy_encoded,
+            "Entropy": round(abs(reference["EntropyOriginal"]
+                                 - entropy_encoded), 3)}
+
+
+def _score_ssim(original, encoded, color_channels, reference):
+    """SSIM, computed only for the encoded channels
+    """
+    if "ssim" not in reference:
+        reference["ssim"] = statistics.get_reference_statistics(original)
+    _, ssim = statistics.get_channel_statistics(
+      reference["ssim"], encoded[np.newaxis], color_channels)
+    return {"SSIM": round(float(ssim.mean()), 3)}
+
+
+def _score_brisque(original, encoded, color_channels, reference):
+    """BRISQUE score of both images and their difference
+    """
+    if "BrisqueOriginal" not in reference:
+        reference["BrisqueOriginal"] = float(statistics.get_brisque(original))
+    brisque_encoded = float(statistics.get_brisque(encoded))
+    return {"BrisqueOriginal": reference["BrisqueOriginal"],
+            "BrisqueEncoded": brisque_encoded,
+            "BRISQUE": round(abs(reference["BrisqueOriginal"]
+                                 - brisque_encoded), 3)}
+
+
+# Measures in the order they are computed (cheapest first):
+# (stage name, rated measures, function).
+STAGES = [
+    ("mse", ("MSE", "PSNR"), _score_mse_psnr),
+    ("entropy", ("Entropy",), _score_entropy),
+    ("ssim", ("SSIM",), _score_ssim),
+    ("brisque", ("BRISQUE",), _score_brisque),
+]
+
+
+def evaluate(original_image, encoded_image, color_channels="RGB",
+             full=False, reference=None):
+    """ Function to decide if an encoding is perceptible.
+        Parameters:
+            original_image - original image (PIL image or (H, W, C) array)
+            encoded_image - encoded image (PIL image or (H, W, C) array)
+            color_channels - channels changed by the encoding, the others
+                             are skipped by SSIM: default = "RGB"
+            full - compute every measure even if the verdict is already
+                   settled: default = False
+            reference - dictionary for values of the original image; pass
+                        the same dictionary for every encoding of one
+                        original so they are only computed once:
+                        default = None
+    return (verdict, scores, ratings) where scores holds the computed
+           values and ratings the rating of every computed measure
+    """
+    original = np.asarray(original_image)
+    encoded = np.asarray(encoded_image)
+    reference = {} if reference is None else reference
+    n_measures = sum(len(measures) for _, measures, _ in STAGES)
+
+    scores = {}
+    ratings = {}
+    n_perceptible = 0
+    for name, measures, function in STAGES:
+        with profiling.stage(name):
+            scores.update(function(original, encoded, color_channels,
+                                   reference))
+        for measure in measures:
+            ratings[measure] = rate(measure, scores[measure])
+            n_perceptible += ratings[measure] != "green"
+
+        # Stop once the unrated measures cannot change the verdict.
+        n_open = n_measures - len(ratings)
+        if not full and verdict(n_perceptible) == verdict(n_perceptible
+                                                           + n_open):
+            break
+
+    profiling.count("measures_skipped", n_measures - len(ratings))
+    return verdict(n_perceptible), scores, ratings
+
+
+def tune(original_image, secret_data, channel_sets=stegano.CHANNEL_SETS,
+         bit_depths=stegano.BIT_DEPTHS, key=None, reference=None):
+    """ Function to find the encoding setting with the highest capacity
+        whose verdict is "Good!". Perceptibility is assumed to grow with the
+        bit depth and with the channels used, so every channel set is binary
+        searched over the bit depths, results are carried over between
+        channel sets (a setting is "Good!" if a setting with more channels
+        and at least as many bits is, and not "Good!" if one with fewer
+        channels and at most as many bits is not) and channel sets which
+        cannot beat the best capacity found are skipped.
+        Parameters:
+            original_image - Image coming from PIL.Image.Open()
+            secret_data - string to be encoded for the evaluation
+            channel_sets - colour channel combinations to choose from:
+                           default = CHANNEL_SETS
+            bit_depths - numbers of bits to choose from: default = BIT_DEPTHS
+            key - key used for encoding: default = None
+            reference - dictionary for values of the original image (see
+                        evaluate()): default = None
+    return (n_bits, color_channels) tuple with the highest capacity (fewer
+           bits for equal capacity) or None if no setting is "Good!"
+    """
+    reference = {} if reference is None else reference
+    bit_depths = sorted(bit_depths)
+    capacities = stegano.capacity(original_image)
+    results = {}
+
+    def capacity(channels, bits):
+        n_bytes = capacities.get((channels, bits))
+        if n_bytes is None:
+            n_bytes = stegano.capacity(original_image, bits, channels)
+        return n_bytes
+
+    def is_good(channels, bits):
+        bands = set(channels.upper())
+        for (other, other_bits), good in results.items():
+            if good and bands <= other and bits <= other_bits:
+                return True
+            if not good and other <= bands and other_bits <= bits:
+                return False
+
+        encoded_image = stegano.encode(original_image, secret_data, bits,
+                                       channels, key)
+        good = evaluate(original_image, encoded_image, channels,
+                        reference=reference)[0] == "Good!"
+        results[(frozenset(bands), bits)] = good
+        profiling.count("tuner_evaluations")
+        return good
+
+    best = None
+    best_capacity = -1
+    for channels in sorted(channel_sets, key=lambda c: -len(set(c))):
+        # Only depths beating the best capacity so far are worth searching.
+        depths = [bits for bits in bit_depths
+                  if capacity(channels, bits) > best_capacity]
+        if not depths:
+            continue
+
+        # Binary search for the deepest "Good!" depth.
+        low, high = -1, len(depths)
+        while high - low > 1:
+            middle = (low + high) // 2
+            if is_good(channels, depths[middle]):
+                low = middle
+            else:
+                high = middle
+
+        if low >= 0:
+            best = (depths[low], channels)
+            best_capacity = capacity(channels, depths[low])
+
+    profiling.logger.debug("Tuned setting %s after %d evaluations", best,
+                           len(results))
+    return best
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy.ndimage.filters import uniform_filter,gaussian_filter
+from scipy.ndimage import correlate1d
 from scipy import signal
 import warnings
 from enum import Enum
@@ -59,6 +60,112 @@ def fspecial(fltr,ws,**kwargs):
 def filter2(img,fltr,mode='same'):
 	return signal.convolve2d(img, np.rot90(fltr,2), mode=mode)
 
+def _correlate_separable(img,col,row,mode):
+	"""correlates the first two axes of img with col and row (zero padding)."""
+	if mode == 'valid':
+		# crop after the first pass so the second one only filters the valid rows
+		rows = img.shape[0] - len(col) + 1
+		cols = img.shape[1] - len(row) + 1
+		out = correlate1d(img,col,axis=0,mode='constant')[len(col)//2:len(col)//2 + rows]
+		return correlate1d(out,row,axis=1,mode='constant')[:,len(row)//2:len(row)//2 + cols]
+	out = correlate1d(img,col,axis=0,mode='constant')
+	return correlate1d(out,row,axis=1,mode='constant')
+
+def filter2_channels(img,fltr,mode='same',backend='separable'):
+	"""filters every channel of a (H,W,C) image like filter2 in one call.
+
+	:param img: (H,W,C) float image.
+	:param fltr: 2D filter.
+	:param mode: 'valid' or 'same' (default = 'same').
+	:param backend: 'separable' (two 1D passes, falls back to 'convolve2d' if fltr is not separable or larger than the image),
+		'fft' or 'convolve2d' (filter2 per channel) (default = 'separable').
+
+	:returns:  (H',W',C) array.
+	"""
+	if backend == 'separable':
+		col,row = fltr.sum(axis=1),fltr.sum(axis=0)
+		# 'valid' filtering of an image smaller than fltr (coarse ms-ssim scales) is left to convolve2d, which swaps the inputs
+		fits = img.shape[0] >= len(col) and img.shape[1] >= len(row)
+		if np.allclose(np.outer(col,row),fltr) and ((mode == 'valid' and fits) or (mode != 'valid' and len(col) % 2 and len(row) % 2)):
+			return _correlate_separable(img,col,row,mode)
+		backend = 'convolve2d'
+	if backend == 'fft':
+		return signal.fftconvolve(img,np.rot90(fltr,2)[:,:,np.newaxis],mode=mode,axes=(0,1))
+	if backend == 'convolve2d':
+		return np.stack([filter2(img[:,:,i],fltr,mode) for i in range(img.shape[2])],axis=2)
+	raise ValueError("Unknown filter backend " + str(backend))
+
+def _reflect_index(n,pad):
+	"""maps the positions -pad..n+pad-1 of an axis of length n padded like ndimage 'reflect' to indices into the axis."""
+	index = np.arange(-pad,n+pad) % (2*n)
+	return np.where(index < n,index,2*n-1-index)
+
+def _integral_image(images,pad,mode='reflect'):
+	"""calculates the summed-area tables of the channels of one or several images padded by pad pixels on every side.
+
+	:param images: (H,W) or (H,W,C) image, or list of such images with the same size.
+	:param pad: padding, at least the largest window size used (may exceed the image size).
+	:param mode: 'reflect' (like uniform_filter) or 'constant' (zero padding).
+
+	:returns:  (channels,H+2*pad+1,W+2*pad+1) float64 array (channel first, so every channel is contiguous).
+	"""
+	if not isinstance(images,list):
+		images = [images]
+	images = [img[:,:,np.newaxis] if img.ndim == 2 else img for img in images]
+	H,W = images[0].shape[:2]
+
+	sat = np.zeros((sum(img.shape[2] for img in images),H+2*pad+1,W+2*pad+1))
+	o = pad + 1
+	k = 0
+	for img in images:
+		for c in range(img.shape[2]):
+			sat[k,o:o+H,o:o+W] = img[:,:,c]
+			k += 1
+
+	if mode == 'reflect':
+		# mirror the edge rows/columns including the edge pixel, like ndimage 'reflect' (repeated
+		# for a padding larger than the image)
+		rows,cols = _reflect_index(H,pad) + o,_reflect_index(W,pad) + o
+		sat[:,1:o,o:o+W] = sat[:,rows[:pad],o:o+W]
+		sat[:,o+H:,o:o+W] = sat[:,rows[pad+H:],o:o+W]
+		sat[:,1:,1:o] = sat[:,1:,cols[:pad]]
+		sat[:,1:,o+W:] = sat[:,1:,cols[pad+W:]]
+
+	# adding whole rows/columns in place is faster than np.cumsum here; sums of
+	# integer images stay exact in float64 up to 2**53
+	for i in range(2,sat.shape[1]):
+		sat[:,i] += sat[:,i-1]
+	for j in range(2,sat.shape[2]):
+		sat[:,:,j] += sat[:,:,j-1]
+	return sat
+
+def _window_sums(sat,ws,pad,shape):
+	"""reads the ws x ws window sum of every pixel (aligned like uniform_filter) from an integral image.
+
+	:returns:  (C,H,W) array for an image of shape (H,W[,C]).
+	"""
+	start = pad - ws//2
+	rows = slice(start,start+shape[0])
+	cols = slice(start,start+shape[1])
+	rows_end = slice(start+ws,start+ws+shape[0])
+	cols_end = slice(start+ws,start+ws+shape[1])
+	return sat[:,rows_end,cols_end] - sat[:,rows,cols_end] - sat[:,rows_end,cols] + sat[:,rows,cols]
+
+def window_means(img,ws,mode='reflect'):
+	"""calculates local means over ws x ws windows, with one integral image for all window sizes.
+
+	:param img: (H,W) or (H,W,C) image, every channel is filtered on its own.
+	:param ws: window size or list of window sizes.
+	:param mode: 'reflect' (like uniform_filter) or 'constant' (zero padding, like filter2 'same' with a uniform window) (default = 'reflect').
+
+	:returns:  array of local means with the shape of img, or a list of arrays if ws is a list.
+	"""
+	sizes = ws if isinstance(ws,(list,tuple)) else [ws]
+	pad = max(sizes)
+	sat = _integral_image(img,pad,mode)
+	means = [np.moveaxis(_window_sums(sat,size,pad,img.shape)/float(size**2),0,2).reshape(img.shape) for size in sizes]
+	return means if isinstance(ws,(list,tuple)) else means[0]
+
 def _str_to_array(str):
 	pattern = r'''# Match (mandatory) whitespace between...
 			(?<=\]) # ] and